@@ -11,6 +11,9 @@ GUI_PATH = "src/gui.py"
 COMPOSE_FILE = "docker-compose.yml"
 
 def start_docker_compose():
+    if os.getenv("DATABASE_URL", "").startswith("sqlite"):
+        print("DATABASE_URL points to SQLite, skipping Docker Compose")
+        return
     if os.path.exists(COMPOSE_FILE):
         print("Starting Docker Compose services...")
         subprocess.run(["docker", "compose", "up", "-d"], check=True)
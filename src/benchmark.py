@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+
+"""
+Load and latency benchmark for every route in db/api.py.
+
+Seeds --users x --tasks tasks with --tags tags each, then drives each route with
+--concurrency clients and reports req/s, p50/p95/p99 latency and DB queries per
+request. Runs in-process (httpx ASGITransport) unless --url points at a running
+server; the database is DATABASE_URL, defaulting to a local SQLite file.
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json   # exit code 1 on a regression
+
+A route regresses when p50 latency grows or throughput drops by more than
+--threshold (default 20%), or when it issues more queries per request than before.
+The read cache is disabled unless --cache is given, so the numbers measure crud.
+"""
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+import httpx
+from sqlalchemy import delete, event, insert
+import main
+from db import cache, crud, database, schemas, tables
+
+PREFIX = "benchuser"
+PROBE_REQUESTS = 20
+AUTH_ROUTES = {"register", "login"}  # bcrypt-bound, so they get --auth-requests
+IMPORT_ROWS = 100
+
+
+def seed(users: int, tasks: int, tags: int, deletable: int) -> dict:
+    """Replaces the benchmark data and returns {username: [task ids]}."""
+    now = datetime.datetime.now()
+    with database.SessionLocal() as db:
+        for table in (tables.Task, tables.TaskChange, tables.TaskVersion, tables.TaskStats):
+            db.execute(delete(table).where(table.created_by.like(f"{PREFIX}%")))
+        db.execute(delete(tables.User).where(tables.User.username.like(f"{PREFIX}%")))
+        owners = [f"{PREFIX}{u}" for u in range(users)]
+        rows = [
+            {
+                "title": f"Task {u}-{i} report", "completed": i % 3 == 0,
+                "tags": ",".join(f"tag{(i + t) % max(tags * 3, 1)}" for t in range(tags)),
+                "due_date": now + datetime.timedelta(days=i % 60 - 30),
+                "created_at": now, "updated_at": now - datetime.timedelta(seconds=i),
+                "created_by": owner, "updated_by": owner,
+            }
+            for u, owner in enumerate(owners) for i in range(tasks)
+        ]
+        rows += [
+            {"title": f"Disposable {i}", "tags": "", "completed": False, "created_at": now, "updated_at": now,
+             "created_by": f"{PREFIX}-delete", "updated_by": f"{PREFIX}-delete"}
+            for i in range(deletable)
+        ]
+        ids = db.scalars(insert(tables.Task).returning(tables.Task.id), rows).all() if rows else []
+        tag_rows = [
+            {"task_id": task_id, "tag": tag, "created_by": row["created_by"]}
+            for task_id, row in zip(ids, rows) for tag in schemas.parse_tags(row["tags"])
+        ]
+        if tag_rows:
+            db.execute(insert(tables.TaskTag), tag_rows)
+        # The bulk insert bypasses crud's writes, so the task_stats counters are rebuilt from the rows.
+        crud._reconcile_stats(db)
+        db.commit()
+    seeded = {}
+    for task_id, row in zip(ids, rows):
+        seeded.setdefault(row["created_by"], []).append(task_id)
+    return seeded
+
+
+def routes(seeded: dict) -> dict:
+    """name -> make(i) returning (method, url, request kwargs) for the i-th request."""
+    users = [user for user in seeded if user != f"{PREFIX}-delete"]
+    deletable = seeded.get(f"{PREFIX}-delete", [])
+
+    def user(i):
+        return users[i % len(users)]
+
+    def task(i):
+        owner = user(i)
+        return owner, seeded[owner][i % len(seeded[owner])]
+
+    def import_body(i):
+        return "".join(json.dumps({"title": f"Imported {i}-{n}", "tags": "imported", "completed": n % 2 == 0}) + "\n"
+                       for n in range(IMPORT_ROWS)).encode("utf-8")
+
+    return {
+        "root": lambda i: ("GET", "/", {}),
+        "health": lambda i: ("GET", "/health", {}),
+        "cache_stats": lambda i: ("GET", "/cache/stats", {}),
+        "metrics": lambda i: ("GET", "/metrics", {}),
+        "list_tasks": lambda i: ("GET", f"/tasks/{user(i)}", {}),
+        "list_tasks_page": lambda i: ("GET", f"/tasks/{user(i)}", {"params": {"limit": 50}}),
+        "list_tasks_search": lambda i: ("GET", f"/tasks/{user(i)}", {"params": {"query": "report", "mode": "fulltext"}}),
+        "list_tasks_tagged": lambda i: ("GET", f"/tasks/{user(i)}", {"params": {"tag": "tag1"}}),
+        "list_tasks_stream": lambda i: ("GET", f"/tasks/{user(i)}", {"params": {"stream": True}}),
+        "list_tasks_overdue": lambda i: ("GET", f"/tasks/{user(i)}", {"params": {"overdue": True, "sort": "due_date", "limit": 50}}),
+        "upcoming": lambda i: ("GET", f"/tasks/{user(i)}/upcoming", {"params": {"within": "7d"}}),
+        "read_task": lambda i: ("GET", "/tasks/{}/{}".format(*task(i)), {}),
+        "tag_counts": lambda i: ("GET", f"/tasks/{user(i)}/tags", {}),
+        "stats": lambda i: ("GET", f"/tasks/{user(i)}/stats", {}),
+        "changes": lambda i: ("GET", f"/tasks/{user(i)}/changes", {"params": {"since": 0}}),
+        "events": lambda i: ("GET", f"/tasks/{user(i)}/events", {"first_chunk": True}),
+        "export_ndjson": lambda i: ("GET", f"/tasks/{user(i)}/export", {"params": {"format": "ndjson"}}),
+        "export_csv": lambda i: ("GET", f"/tasks/{user(i)}/export", {"params": {"format": "csv"}}),
+        "import": lambda i: ("POST", f"/tasks/{PREFIX}-import/import", {"params": {"format": "ndjson"}, "content": import_body(i)}),
+        "create_task": lambda i: ("POST", f"/tasks/{user(i)}", {"json": {"title": f"Bench {i}", "tags": "bench"}}),
+        "update_task": lambda i: ("PUT", "/tasks/{}/{}".format(*task(i)), {"json": {"completed": i % 2 == 0}}),
+        "batch": lambda i: ("POST", f"/tasks/{user(i)}/batch", {"json": {"operations": [
+            {"op": "create", "task": {"title": f"Batch {i}"}},
+            {"op": "update", "id": task(i)[1], "task": {"title": f"Batched {i}"}},
+        ]}}),
+        "delete_task": lambda i: ("DELETE", f"/tasks/{PREFIX}-delete/{deletable[i]}", {}),
+        "register": lambda i: ("POST", "/register", {"json": {"username": f"{PREFIX}-{uuid.uuid4().hex}", "password": "benchmark"}}),
+        "login": lambda i: ("POST", "/login", {"json": {"username": f"{PREFIX}-login", "password": "benchmark"}}),
+        "users": lambda i: ("GET", "/users", {}),
+    }
+
+
+class QueryCounter:
+    """Counts statements on the engines; only meaningful while one request runs at a time."""
+
+    def __init__(self):
+        self.count = 0
+        self.engines = [database.engine] + ([database.async_engine.sync_engine] if database.async_engine else [])
+
+    def _record(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._record)
+
+
+async def asgi_first_chunk(app, url: str) -> tuple[float, bool]:
+    """
+    GETs url from the ASGI app until the first body chunk, then disconnects. For endless
+    streams (/events) in-process, since httpx's ASGITransport waits for the whole body.
+    """
+    path, _, query = url.partition("?")
+    first, status, requested = asyncio.Event(), 0, False
+    elapsed = 0.0
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await first.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, elapsed
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif not first.is_set() and (message.get("body") or not message.get("more_body", False)):
+            elapsed = time.perf_counter() - start
+            first.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"accept", b"text/event-stream")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return elapsed, status < 400
+
+
+async def send(client, make, i, app=None) -> tuple[float, bool]:
+    method, url, kwargs = make(i)
+    if kwargs.pop("first_chunk", False):
+        if app is not None:
+            return await asgi_first_chunk(app, url)
+        start = time.perf_counter()
+        async with client.stream(method, url, headers={"Accept": "text/event-stream"}) as response:
+            async for _ in response.aiter_raw():
+                break
+        return time.perf_counter() - start, response.status_code < 400
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    await response.aread()
+    return time.perf_counter() - start, response.status_code < 400
+
+
+async def run_route(client, make, requests: int, concurrency: int, count_queries: bool, app=None) -> dict:
+    queries = None
+    if count_queries:
+        with QueryCounter() as counter:
+            for i in range(PROBE_REQUESTS):
+                await send(client, make, i, app)
+        queries = counter.count / PROBE_REQUESTS
+
+    latencies, errors = [], 0
+    next_index = iter(range(PROBE_REQUESTS, PROBE_REQUESTS + requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            elapsed, ok = await send(client, make, i, app)
+            latencies.append(elapsed)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": requests, "errors": errors, "rps": round(requests / wall, 1),
+        "p50_ms": round(cuts[49] * 1000, 2), "p95_ms": round(cuts[94] * 1000, 2), "p99_ms": round(cuts[98] * 1000, 2),
+        "queries_per_request": queries,
+    }
+
+
+async def run(args) -> dict:
+    in_process = args.url is None
+    if not args.cache:
+        cache.configure(cache.LRUCache(maxsize=0))
+    database.init_db()
+    selected = args.routes.split(",") if args.routes else None
+    deletable = PROBE_REQUESTS + args.requests if not selected or "delete_task" in selected else 0
+    seeded = seed(args.users, args.tasks, args.tags, deletable)
+
+    transport = httpx.ASGITransport(app=main.app) if in_process else None
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url=args.url or "http://bench", timeout=60) as client:
+        await client.post("/register", json={"username": f"{PREFIX}-login", "password": "benchmark"})
+        for name, make in routes(seeded).items():
+            if selected and name not in selected:
+                continue
+            requests = args.auth_requests if name in AUTH_ROUTES else args.requests
+            results[name] = await run_route(client, make, requests, args.concurrency, count_queries=in_process,
+                                            app=main.app if in_process else None)
+            print(format_row(name, results[name]), flush=True)
+    await database.close_db()
+    return {
+        "meta": {
+            "backend": database.engine.dialect.name, "async": database.ASYNC_DB, "in_process": in_process,
+            "users": args.users, "tasks": args.tasks, "tags": args.tags, "concurrency": args.concurrency,
+            "python": platform.python_version(), "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "routes": results,
+    }
+
+
+def format_row(name: str, r: dict) -> str:
+    queries = "-" if r["queries_per_request"] is None else f"{r['queries_per_request']:.1f}"
+    return (f"{name:<20} {r['rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  "
+            f"p99 {r['p99_ms']:>8.2f} ms  queries {queries:>5}  errors {r['errors']}")
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Returns one message per regressed route."""
+    regressions = []
+    for name, now in current["routes"].items():
+        before = baseline["routes"].get(name)
+        if before is None:
+            continue
+        if now["p50_ms"] > before["p50_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p50 {before['p50_ms']} ms -> {now['p50_ms']} ms")
+        if now["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['rps']} -> {now['rps']} req/s")
+        if None not in (now["queries_per_request"], before["queries_per_request"]) \
+                and now["queries_per_request"] > before["queries_per_request"]:
+            regressions.append(f"{name}: queries/request {before['queries_per_request']} -> {now['queries_per_request']}")
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {now['errors']}")
+    return regressions
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the task API.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=200, help="tasks per user")
+    parser.add_argument("--tags", type=int, default=3, help="tags per task")
+    parser.add_argument("--requests", type=int, default=300, help="timed requests per route")
+    parser.add_argument("--auth-requests", type=int, default=30, help="timed requests for /register and /login")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--routes", help="comma-separated subset of routes")
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--cache", action="store_true", help="keep the read cache enabled")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for message in regressions:
+            print("REGRESSION", message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
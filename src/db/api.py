@@ -1,75 +1,385 @@
 
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
-from db import crud, database, schemas, tables
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Any, Literal
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from db import authentication, cache, crud, database, events, metrics, schemas, transfer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db.authentication import hash_password, verify_password
 
 router = APIRouter()
 
-def get_db():
+class TaskListResponse(Response):
+    """
+    Serializes crud's task dicts straight to JSON with orjson. The rows come from the
+    database in TaskResponse field order, so re-validating them through the response
+    model would only repeat work; the bytes are the same as FastAPI's default output.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+async def get_db():
+    """Yields an AsyncSession when DB_ASYNC is enabled, otherwise a sync Session."""
+    if database.ASYNC_DB:
+        async with database.AsyncSessionLocal() as db:
+            yield db
+        return
     db = database.SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
+
+async def run_crud(func, *args, db: Session | AsyncSession, **kwargs):
+    """
+    Awaitable version of any crud function: func(*args, db=<session>, **kwargs).
+    With an AsyncSession it runs through run_sync on the event loop (no thread);
+    with a sync Session it runs in the threadpool like a plain def endpoint would.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(lambda session: func(*args, db=session, **kwargs))
+    return await run_in_threadpool(func, *args, db=db, **kwargs)
+
+async def cached_crud(key: tuple, func, *args, db, **kwargs):
+    """run_crud through the read cache; key must start with the username (see db/cache.py)."""
+    generation = cache.backend.generation(key[0])
+    value = cache.backend.get(key)
+    if value is cache.MISS:
+        value = await run_crud(func, *args, db=db, **kwargs)
+        cache.backend.set(key, value, generation)
+    return value
+
+def authorize(username: str, authorization: str | None = Header(None)):
+    """
+    Checks the bearer session token issued by /login against the path's username.
+    Requests without a token are let through unless REQUIRE_SESSION_TOKEN is set.
+    """
+    if authorization is None:
+        if authentication.REQUIRE_SESSION_TOKEN:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        return
+    scheme, _, token = authorization.partition(" ")
+    token_user = authentication.verify_session_token(token) if scheme.lower() == "bearer" else None
+    if token_user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    if token_user != username:
+        raise HTTPException(status_code=403, detail="Token does not belong to this user")
+
+async def run_hashing(func, *args):
+    try:
+        return await func(*args)
+    except authentication.HashingOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+
+def session_response(username: str, message: str, status_code: int) -> JSONResponse:
+    return JSONResponse(content={
+        "message": message,
+        "access_token": authentication.create_session_token(username),
+        "token_type": "bearer",
+        "expires_in": authentication.SESSION_TTL,
+    }, status_code=status_code)
+
+"""
+Conditional requests. Every write bumps the user's collection version (crud.get_version),
+which doubles as the ETag of all of that user's task resources. Answering
+If-None-Match only reads task_versions, never the tasks table.
+"""
+def format_etag(version: int) -> str:
+    return f'"{version}"'
+
+async def conditional_get(username: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    version, modified = await cached_crud((username, "version"), crud.get_version, username, db=db)
+    headers = {"ETag": format_etag(version)}
+    if modified:
+        headers["Last-Modified"] = format_datetime(modified.astimezone(timezone.utc), usegmt=True)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or headers["ETag"] in tags:
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+def expected_version(if_match: str | None = Header(None)) -> int | None:
+    """The collection version a write is conditional on, parsed from If-Match."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Precondition failed")
+
+async def run_conditional_write(func, *args, db, **kwargs):
+    try:
+        return await run_crud(func, *args, db=db, **kwargs)
+    except crud.VersionConflict:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Precondition failed")
 
 @router.get("/")
 def root():
     return {"message": "API is running"}
 
+@router.get("/health")
+async def health():
+    """Database connectivity plus the active pool configuration and usage."""
+    try:
+        return await run_in_threadpool(database.check_connection)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {type(e).__name__}")
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(database.pool_status(), cache.backend.stats()),
+                             media_type="text/plain; version=0.0.4")
+
+@router.get("/cache/stats")
+def cache_stats():
+    return cache.backend.stats()
+
+
+@router.get("/tasks/{username}/tags", response_model=list[schemas.TagCount], dependencies=[Depends(authorize)])
+async def list_tag_counts(username: str, db: Session = Depends(get_db)):
+    return await run_crud(crud.get_tag_counts, username, db=db)
+
+@router.get("/tasks/{username}/stats", response_model=schemas.TaskStats, dependencies=[Depends(authorize)])
+async def task_stats(username: str, db: Session = Depends(get_db)):
+    return await cached_crud((username, "stats"), crud.get_stats, username, db=db)
+
+@router.get("/tasks/{username}/changes", response_model=schemas.TaskChanges, dependencies=[Depends(authorize)])
+async def list_changes(username: str, since: str | None = None, db: Session = Depends(get_db)):
+    try:
+        since_version = int(since) if since is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return await run_crud(crud.get_changes, username, db=db, since=since_version)
+
+EVENT_HEARTBEAT_SECONDS = 15
+
+def sse_message(event: str, data: dict, event_id: int | None = None) -> bytes:
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: ".encode("utf-8") + orjson.dumps(data) + b"\n\n"
+
+async def event_stream(subscription: events.Subscription):
+    try:
+        yield b"retry: 2000\n\n" + sse_message("ready", {})
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"  # keeps proxies from closing an idle stream
+                continue
+            if event is events.DROPPED:
+                yield sse_message("dropped", {})
+                return
+            yield sse_message("tasks", event, event["version"])
+    finally:
+        events.broker.unsubscribe(subscription)
+
+@router.get("/tasks/{username}/events", dependencies=[Depends(authorize)])
+async def task_events(username: str):
+    """
+    Server-Sent Events. "ready" once connected, then one "tasks" event per committed
+    write with the created/updated/deleted ids; fetch the rows from /changes. A
+    "dropped" event means the client fell behind and must reconnect and resync.
+    """
+    try:
+        subscription = events.broker.subscribe(username)
+    except events.TooManySubscribers:
+        raise HTTPException(status_code=429, detail="Too many event streams for this user")
+    return StreamingResponse(event_stream(subscription), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def export_tasks(username: str, format: str):
+    db = database.SessionLocal()
+    try:
+        yield from transfer.export_chunks(crud.iter_tasks(username, db), format)
+    finally:
+        db.close()
 
-@router.get("/tasks/{username}/{task_id}", response_model=schemas.TaskResponse)
-def read_task(username, task_id: int, db: Session = Depends(get_db)):
-    db_task = crud.get_task(username, db, task_id=task_id)
+@router.get("/tasks/{username}/export", dependencies=[Depends(authorize)])
+async def export_task_set(username: str, format: Literal["ndjson", "csv"] = "ndjson"):
+    """All of the user's tasks, streamed from a server-side cursor."""
+    return StreamingResponse(export_tasks(username, format), media_type=transfer.FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{username}-tasks.{format}"'})
+
+@router.post("/tasks/{username}/import", response_model=schemas.ImportResult, dependencies=[Depends(authorize)])
+async def import_task_set(username: str, request: Request, format: Literal["ndjson", "csv"] = "ndjson"):
+    """
+    Loads the raw request body (the output of /export, or any file with the same
+    fields) while it is still uploading: the event loop feeds chunks to a loader
+    thread through transfer.ChunkReader.
+    """
+    reader = transfer.ChunkReader()
+
+    async def feed():
+        try:
+            async for chunk in request.stream():
+                if chunk and not await run_in_threadpool(reader.put, chunk):
+                    return
+        finally:
+            await run_in_threadpool(reader.put, None)
+
+    def load():
+        db = database.SessionLocal()
+        try:
+            return crud.import_tasks(username, db, transfer.parse_records(reader, format))
+        finally:
+            reader.close()
+            db.close()
+
+    _, result = await asyncio.gather(feed(), run_in_threadpool(load))
+    return result
+
+WITHIN_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+@router.get("/tasks/{username}/upcoming", response_model=list[schemas.TaskResponse], dependencies=[Depends(authorize)])
+async def list_upcoming(username: str, response: Response, db: Session = Depends(get_db),
+                        within: str = Query("7d", pattern=r"^\d+[mhdw]$"),
+                        limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=1000), cursor: str | None = None):
+    """Open tasks due between now and now + within (e.g. 90m, 12h, 7d, 2w), soonest first."""
+    try:
+        window = timedelta(**{WITHIN_UNITS[within[-1]]: int(within[:-1])})
+        tasks, next_cursor = await run_crud(crud.get_upcoming, username, db=db, within=window, limit=limit, cursor=cursor)
+    except OverflowError:
+        raise HTTPException(status_code=400, detail="Invalid window")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return TaskListResponse(tasks, headers=dict(response.headers))
+
+@router.get("/tasks/{username}/{task_id}", response_model=schemas.TaskResponse, dependencies=[Depends(authorize), Depends(conditional_get)])
+async def read_task(username, task_id: int, db: Session = Depends(get_db)):
+    db_task = await cached_crud((username, "task", task_id), crud.get_task, username, db=db, task_id=task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
     return db_task
 
-@router.get("/tasks/{username}", response_model=list[schemas.TaskResponse])
-def list_tasks(username : str, db : Session = Depends(get_db), query: str | None = None, completed: bool | None = None):
-    return crud.get_tasks(username = username, db=db, query=query, completed=completed)
+def local_time(value: datetime | None) -> datetime | None:
+    """Due dates are stored as naive local time, so aware query values are converted to match."""
+    return value.astimezone().replace(tzinfo=None) if value and value.tzinfo else value
+
+def task_filters(tag: str | None = None, tags_all: str | None = None, tags_any: str | None = None,
+                 due_after: datetime | None = None, due_before: datetime | None = None, overdue: bool = False,
+                 sort: Literal["updated_at", "due_date"] | None = None):
+    """
+    Exact tag filters (tags_all/tags_any take comma-separated lists; tag is shorthand for
+    one tag), a due-date window [due_after, due_before), overdue=true for open tasks past
+    their due date, and the sort order. Search results are ranked unless sort is given.
+    """
+    return {
+        "tags_all": schemas.parse_tags(",".join(t for t in (tag, tags_all) if t)),
+        "tags_any": schemas.parse_tags(tags_any),
+        "due_after": local_time(due_after),
+        "due_before": local_time(due_before),
+        "overdue": overdue,
+        "sort": sort,
+    }
+
+def filters_key(filters: dict) -> tuple:
+    return tuple(tuple(value) if isinstance(value, list) else value for value in filters.values())
+
+STREAM_CHUNK_ROWS = 500
+
+def stream_tasks(username: str, query: str | None, completed: bool | None, mode: str, filters: dict):
+    # The request-scoped session from get_db is closed before a streamed body is sent,
+    # so the stream owns its session for as long as rows are being written.
+    db = database.SessionLocal()
+    try:
+        # One chunk per STREAM_CHUNK_ROWS rows; a chunk per row costs more in ASGI sends than in JSON.
+        chunk, first = [], True
+        for task in crud.iter_tasks(username, db, query=query, completed=completed, mode=mode, **filters):
+            chunk.append(orjson.dumps(task, option=orjson.OPT_UTC_Z))
+            if len(chunk) == STREAM_CHUNK_ROWS:
+                yield (b"[" if first else b",") + b",".join(chunk)
+                chunk, first = [], False
+        yield (b"[" if first else (b"," if chunk else b"")) + b",".join(chunk) + b"]"
+    finally:
+        db.close()
+
+@router.get("/tasks/{username}", response_model=list[schemas.TaskResponse], dependencies=[Depends(authorize), Depends(conditional_get)])
+async def list_tasks(username : str, response: Response, db : Session = Depends(get_db), query: str | None = None, completed: bool | None = None,
+               mode: Literal["prefix", "substring", "fulltext"] = "substring", filters: dict = Depends(task_filters),
+               limit: int | None = Query(None, ge=1, le=1000), cursor: str | None = None, stream: bool = False):
+    if stream:
+        if limit is not None or cursor is not None:
+            raise HTTPException(status_code=400, detail="stream=true returns the whole list; it can't be combined with limit or cursor")
+        return StreamingResponse(stream_tasks(username, query, completed, mode, filters), media_type="application/json",
+                                 headers=dict(response.headers))
+    if limit is None and cursor is None:
+        key = (username, "list", query, completed, mode, *filters_key(filters))
+        tasks = await cached_crud(key, crud.get_tasks, username, db=db, query=query, completed=completed, mode=mode, **filters)
+        return TaskListResponse(tasks, headers=dict(response.headers))
+    limit = limit or crud.DEFAULT_PAGE_SIZE
+    key = (username, "page", query, completed, mode, *filters_key(filters), limit, cursor)
+    try:
+        tasks, next_cursor = await cached_crud(key, crud.get_tasks_page, username, db=db, query=query, completed=completed,
+                                               limit=limit, cursor=cursor, mode=mode, **filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return TaskListResponse(tasks, headers=dict(response.headers))
 
 
-@router.post("/tasks/{username}", status_code=201, response_model=schemas.TaskResponse)
-def create_task(username, task: schemas.TaskCreate, db: Session = Depends(get_db)):
-    return crud.create_task(username=username,db=db, task=task)
+@router.post("/tasks/{username}", status_code=201, response_model=schemas.TaskResponse, dependencies=[Depends(authorize)])
+async def create_task(username, task: schemas.TaskCreate, db: Session = Depends(get_db)):
+    return await run_crud(crud.create_task, username, db=db, task=task)
 
-@router.put("/tasks/{username}/{task_id}", response_model=schemas.TaskResponse)
-def update_task(username, task_id: int, task: schemas.TaskUpdate, db: Session = Depends(get_db)):
-    updated = crud.update_task(username,db=db, task_id=task_id, task=task)
+@router.post("/tasks/{username}/batch", response_model=schemas.BatchResponse, dependencies=[Depends(authorize)])
+async def batch_tasks(username, batch: schemas.BatchRequest, response: Response, db: Session = Depends(get_db),
+                      version: int | None = Depends(expected_version)):
+    result = await run_conditional_write(crud.batch_tasks, username, db=db, operations=batch.operations,
+                                         atomic=batch.mode == "all_or_nothing", expected_version=version)
+    if not result["committed"]:
+        response.status_code = status.HTTP_409_CONFLICT
+    return result
+
+@router.put("/tasks/{username}/{task_id}", response_model=schemas.TaskResponse, dependencies=[Depends(authorize)])
+async def update_task(username, task_id: int, task: schemas.TaskUpdate, db: Session = Depends(get_db),
+                      version: int | None = Depends(expected_version)):
+    updated = await run_conditional_write(crud.update_task, username, db=db, task_id=task_id, task=task,
+                                          expected_version=version)
     if not updated:
         raise HTTPException(status_code=404, detail="Task not found")
     return updated
 
-@router.delete("/tasks/{username}/{task_id}", status_code=204)
-def delete_task(username, task_id: int, db: Session = Depends(get_db)):
-    success = crud.delete_task(username, db=db, task_id=task_id)
+@router.delete("/tasks/{username}/{task_id}", status_code=204, dependencies=[Depends(authorize)])
+async def delete_task(username, task_id: int, db: Session = Depends(get_db),
+                      version: int | None = Depends(expected_version)):
+    success = await run_conditional_write(crud.delete_task, username, db=db, task_id=task_id,
+                                          expected_version=version)
     if not success:
         raise HTTPException(status_code=404, detail="Task not found")
     return None
 
 @router.post("/register")
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    if db.query(tables.User).filter(tables.User.username == user.username).first():
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    if await run_crud(crud.get_user, db=db, username=user.username):
         raise HTTPException(status_code=400, detail="Username already registered")
-    if crud.create_user(db, user):
-        return JSONResponse(content={"message": "User registered"}, status_code=status.HTTP_201_CREATED)
+    password_hash = await run_hashing(authentication.hash_password_async, user.password)
+    if await run_crud(crud.create_user, db=db, user=user, password_hash=password_hash):
+        return session_response(user.username, "User registered", status.HTTP_201_CREATED)
 
 @router.post("/login")
-def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    if crud.authenticate_user(db, user.username, user.password):
-        return JSONResponse(content={"message": "Login successful"}, status_code=status.HTTP_200_OK)
+async def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
+    password_hash = await run_crud(crud.get_password_hash, db=db, username=user.username)
+    if password_hash and await run_hashing(authentication.verify_password_async, user.password, password_hash):
+        return session_response(user.username, "Login successful", status.HTTP_200_OK)
     else:
         raise HTTPException(status_code=401, detail="Invalid username or password")
-    
-    
+
+
 
 """
 NB!!! This is only for testing purposes and should be removed or protected in production.
 """
 @router.get("/users")
-def get_users(db: Session = Depends(get_db)):
-    users = crud.get_users(db)
+async def get_users(db: Session = Depends(get_db)):
+    users = await run_crud(crud.get_users, db=db)
     return users
\ No newline at end of file
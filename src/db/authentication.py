@@ -1,4 +1,13 @@
+import asyncio
+import base64
 import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 import bcrypt
 
 def hash_password(password: str) -> str:
@@ -10,3 +19,81 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     sha_hex = hashlib.sha256(password.encode("utf-8")).hexdigest().encode("utf-8")
     return bcrypt.checkpw(sha_hex, hashed.encode("utf-8"))
+
+"""
+Password hashing runs in a process pool so bcrypt never holds the event loop, the
+threadpool or the GIL. At most HASH_QUEUE_LIMIT hashes may be running or waiting;
+beyond that HashingOverloaded is raised right away and the API answers 503.
+"""
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(HASH_WORKERS * 4)))
+
+class HashingOverloaded(Exception):
+    pass
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: forking a process that already runs threads (uvicorn, the threadpool) is unsafe
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+async def _run_hash(func, *args):
+    global _pending
+    with _lock:
+        if _pending >= HASH_QUEUE_LIMIT:
+            raise HashingOverloaded()
+        _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    finally:
+        with _lock:
+            _pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await _run_hash(verify_password, password, hashed)
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+"""
+Session tokens: base64url("<username>:<expires>") + "." + HMAC-SHA256 signature.
+Checking one is a single HMAC, so task requests never touch bcrypt. Without
+SESSION_SECRET a random secret is generated per process, which means tokens do not
+survive a restart and are not shared between workers.
+"""
+SESSION_SECRET = os.getenv("SESSION_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+REQUIRE_SESSION_TOKEN = os.getenv("REQUIRE_SESSION_TOKEN", "").lower() in ("1", "true", "yes")
+
+def _sign(payload: bytes) -> str:
+    digest = hmac.new(SESSION_SECRET, payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+def create_session_token(username: str, ttl: int = SESSION_TTL) -> str:
+    payload = base64.urlsafe_b64encode(f"{username}:{int(time.time()) + ttl}".encode("utf-8"))
+    return payload.rstrip(b"=").decode("ascii") + "." + _sign(payload.rstrip(b"="))
+
+def verify_session_token(token: str) -> str | None:
+    """Returns the token's username, or None if the token is malformed, forged or expired."""
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(_sign(payload.encode("ascii", "replace")).encode("ascii"), signature.encode("utf-8")):
+        return None
+    try:
+        decoded = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)).decode("utf-8")
+        username, _, expires = decoded.rpartition(":")
+        if int(expires) < time.time():
+            return None
+    except ValueError:
+        return None
+    return username
@@ -0,0 +1,145 @@
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+
+"""
+Read cache in front of crud.get_tasks / crud.get_task.
+
+Keys are tuples starting with the username, values are the plain dicts crud returns.
+crud._commit_changes invalidates after every committed write: all of the user's list
+entries plus the entries for the task ids that changed.
+
+The default backend is an in-process LRU, so each uvicorn worker has its own copy and
+only sees its own writes; running several workers needs a shared CacheBackend (or a
+short TTL). TASK_CACHE_SIZE=0 disables caching.
+"""
+
+MISS = object()
+
+
+class CacheBackend(ABC):
+    """Interface for cache backends. A shared backend (e.g. Redis) implements the same methods."""
+
+    @abstractmethod
+    def get(self, key):
+        """Returns the cached value or MISS."""
+
+    @abstractmethod
+    def set(self, key, value, generation: int):
+        """Stores value unless the key's user was invalidated after `generation` was read."""
+
+    @abstractmethod
+    def generation(self, username: str) -> int:
+        """Changes with every invalidate(username) and never goes back to an earlier value."""
+
+    @abstractmethod
+    def invalidate(self, username: str, task_ids=()):
+        pass
+
+    @abstractmethod
+    def stats(self) -> dict:
+        pass
+
+
+class LRUCache(CacheBackend):
+    """
+    Thread-safe LRU with a per-entry TTL and a maximum number of entries.
+
+    Generations come from one counter. Only the maxsize most recently invalidated users
+    keep their own; the others share _generation_floor, the highest one dropped, so a
+    user's generation never goes back to a value a reader may still hold.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._generations = OrderedDict()
+        self._generation_counter = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            expires, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, generation: int):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            # A write committed while the value was being read; it may already be stale.
+            if self._generations.get(key[0], self._generation_floor) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        del self._entries[key]
+        user_keys = self._user_keys[key[0]]
+        user_keys.discard(key)
+        if not user_keys:
+            del self._user_keys[key[0]]
+
+    def generation(self, username: str) -> int:
+        with self._lock:
+            return self._generations.get(username, self._generation_floor)
+
+    def invalidate(self, username: str, task_ids=()):
+        task_ids = set(task_ids)
+        with self._lock:
+            self._generation_counter += 1
+            self._generations[username] = self._generation_counter
+            self._generations.move_to_end(username)
+            while len(self._generations) > self.maxsize:
+                self._generation_floor = self._generations.popitem(last=False)[1]
+            stale = [
+                key for key in self._user_keys.get(username, ())
+                if key[1] != "task" or key[2] in task_ids
+            ]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "lru", "size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations, "invalidations": self.invalidations,
+            }
+
+
+backend: CacheBackend = LRUCache(
+    maxsize=int(os.getenv("TASK_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("TASK_CACHE_TTL", "30")),
+)
+
+
+def configure(new_backend: CacheBackend):
+    """Swaps in another backend, e.g. a shared one when running several workers."""
+    global backend
+    backend = new_backend
+
+
+def invalidate(username: str, task_ids=()):
+    backend.invalidate(username, task_ids)
@@ -1,68 +1,545 @@
 from ctypes import Array
+import base64
+import csv
 import datetime
+import io
+import json
+import time
 from narwhals import String
 from sqlalchemy.orm import Session
 from . import tables
-from db import schemas, tables
-from sqlalchemy import or_
+from db import cache, events, schemas, search, tables
+from sqlalchemy import Boolean, DateTime, Integer, and_, case, column, delete, func, insert, literal, or_, select, text, update
+from sqlalchemy import values as values_clause
+from sqlalchemy.dialects import postgresql, sqlite
 from db.authentication import hash_password, verify_password
 
+# In schemas.TaskResponse field order, so a row dict serializes exactly like the response model.
+TASK_COLUMNS = [tables.Task.__table__.c[name] for name in schemas.TaskResponse.model_fields]
+
+def _rows(q):
+    """Runs an ORM task query as plain column tuples and returns them as dicts."""
+    return [dict(row._mapping) for row in q.with_entities(*TASK_COLUMNS)]
+
 def get_task(username, db: Session, task_id: int):
-    return db.query(tables.Task).filter(tables.Task.created_by == username).filter(tables.Task.id == task_id).first()
+    rows = _rows(db.query(tables.Task).filter(tables.Task.created_by == username).filter(tables.Task.id == task_id))
+    return rows[0] if rows else None
 
-def get_tasks(username, db: Session,  query: str = "", completed: bool | None = None):
+def _tagged_task_ids(username, tags: list[str], match_all: bool):
+    q = select(tables.TaskTag.task_id).where(tables.TaskTag.created_by == username, tables.TaskTag.tag.in_(tags))
+    if match_all:
+        q = q.group_by(tables.TaskTag.task_id).having(func.count() == len(tags))
+    return q
+
+def _filter_tasks(username, db: Session, query: str = "", completed: bool | None = None,
+                  mode: str = "substring", ranked: bool = False,
+                  tags_all: list[str] | None = None, tags_any: list[str] | None = None,
+                  due_before: datetime.datetime | None = None, due_after: datetime.datetime | None = None,
+                  overdue: bool = False):
+    """due_after is inclusive, due_before exclusive; overdue means open and due before now."""
     q = db.query(tables.Task).filter(tables.Task.created_by == username)
+    if overdue:
+        completed = False
+        now = datetime.datetime.now()
+        due_before = min(due_before, now) if due_before else now
+    if due_after is not None:
+        q = q.filter(tables.Task.due_date >= due_after)
+    if due_before is not None:
+        q = q.filter(tables.Task.due_date < due_before)
     if query:
-        q = q.filter(or_(
-            tables.Task.title.ilike(f"%{query}%"),
-            tables.Task.tags.ilike(f"%{query}%")
-        ))
+        q = search.filter_tasks(q, db.get_bind().dialect.name, query, mode=mode, ranked=ranked)
     if completed is not None:
         q = q.filter(tables.Task.completed == completed)
-    return q.all()
+    if tags_all:
+        q = q.filter(tables.Task.id.in_(_tagged_task_ids(username, tags_all, match_all=True)))
+    if tags_any:
+        q = q.filter(tables.Task.id.in_(_tagged_task_ids(username, tags_any, match_all=False)))
+    return q
 
-def create_task(username, db: Session, task: schemas.TaskCreate):
-    db_task = tables.Task(**task.dict())
-    db_task.created_by = username
-    db_task.updated_by = username
-    db_task.created_at = datetime.datetime.now()
-    db_task.updated_at = datetime.datetime.now()    
-    db.add(db_task)
+def get_tasks(username, db: Session,  query: str = "", completed: bool | None = None, mode: str = "substring",
+              sort: str | None = None, **filters):
+    """Search results (query given) are ordered by relevance unless a sort is given."""
+    q = _filter_tasks(username, db, query, completed, mode=mode, ranked=sort is None, **filters)
+    return _rows(q.order_by(*SORT_KEYS[sort]) if sort else q)
+
+def get_tag_counts(username, db: Session):
+    return db.execute(
+        select(tables.TaskTag.tag, func.count().label("count"))
+        .where(tables.TaskTag.created_by == username)
+        .group_by(tables.TaskTag.tag)
+        .order_by(func.count().desc(), tables.TaskTag.tag)
+    ).mappings().all()
+
+def _set_tags(username, db: Session, task_tags: list[tuple[int, str | None]], replace: bool = True):
+    """Writes task_tags rows for [(task_id, tags string), ...] in one executemany."""
+    if replace:
+        db.execute(delete(tables.TaskTag).where(tables.TaskTag.task_id.in_([task_id for task_id, _ in task_tags])))
+    values = [
+        {"task_id": task_id, "tag": tag, "created_by": username}
+        for task_id, tags in task_tags for tag in schemas.parse_tags(tags)
+    ]
+    if values:
+        db.execute(insert(tables.TaskTag), values)
+
+"""
+Keyset pagination. Pages are ordered by (updated_at, id) or (due_date, id) and the
+cursor is an opaque token holding the sort key of the last row on the previous page,
+so fetching page N costs the same as fetching page 1 (no OFFSET). Tasks without a due
+date come last in due_date order.
+"""
+DEFAULT_PAGE_SIZE = 100
+SORT_KEYS = {
+    "updated_at": (tables.Task.updated_at, tables.Task.id),
+    "due_date": (tables.Task.due_date.asc().nulls_last(), tables.Task.id),
+}
+
+def encode_cursor(task, sort: str = "updated_at") -> str:
+    value = task[sort].isoformat() if task[sort] is not None else None
+    raw = json.dumps([value, task["id"]] if sort == "updated_at" else [value, task["id"], sort]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, sort: str = "updated_at"):
+    """Returns (sort value, id); raises ValueError if the cursor is malformed or from another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, task_id, *rest = json.loads(raw)
+        if rest != ([] if sort == "updated_at" else [sort]) or (value is None and sort == "updated_at"):
+            raise ValueError("Cursor belongs to another sort order")
+        return (datetime.datetime.fromisoformat(value) if value is not None else None), int(task_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _after_cursor(q, sort: str, value, task_id: int):
+    column = getattr(tables.Task, sort)
+    if value is None:
+        # Already in the trailing NULL block.
+        return q.filter(column.is_(None), tables.Task.id > task_id)
+    after = or_(column > value, and_(column == value, tables.Task.id > task_id))
+    return q.filter(or_(after, column.is_(None)) if sort == "due_date" else after)
+
+def get_tasks_page(username, db: Session, query: str = "", completed: bool | None = None,
+                   limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None, mode: str = "substring",
+                   sort: str | None = None, **filters):
+    """
+    Returns (tasks, next_cursor); next_cursor is None on the last page.
+    Pages keep the keyset order, so search results are not ranked here.
+    """
+    sort = sort or "updated_at"
+    q = _filter_tasks(username, db, query, completed, mode=mode, **filters)
+    if cursor:
+        q = _after_cursor(q, sort, *decode_cursor(cursor, sort))
+    tasks = _rows(q.order_by(*SORT_KEYS[sort]).limit(limit + 1))
+    if len(tasks) > limit:
+        return tasks[:limit], encode_cursor(tasks[limit - 1], sort)
+    return tasks, None
+
+def get_upcoming(username, db: Session, within: datetime.timedelta, limit: int = DEFAULT_PAGE_SIZE,
+                 cursor: str | None = None):
+    """Open tasks due from now until now + within, soonest first, as (tasks, next_cursor)."""
+    now = datetime.datetime.now()
+    return get_tasks_page(username, db, completed=False, due_after=now, due_before=now + within,
+                          limit=limit, cursor=cursor, sort="due_date")
+
+def iter_tasks(username, db: Session, query: str = "", completed: bool | None = None, batch_size: int = 500,
+               mode: str = "substring", sort: str | None = None, **filters):
+    """Yields tasks from a server-side cursor, batch_size rows at a time."""
+    q = _filter_tasks(username, db, query, completed, mode=mode, **filters).order_by(*SORT_KEYS[sort or "updated_at"])
+    for row in q.with_entities(*TASK_COLUMNS).yield_per(batch_size):
+        yield dict(row._mapping)
+
+"""
+Write helpers shared by the single-task and batch paths. Each one is a constant number
+of statements regardless of how many tasks it touches, and none of them commit, so
+callers decide the transaction boundary.
+"""
+
+def _insert_tasks(username, db: Session, tasks: list[schemas.TaskCreate]) -> list[dict]:
+    now = datetime.datetime.now()
+    rows = [
+        {**task.model_dump(), "completed": bool(task.completed),
+         "created_by": username, "updated_by": username, "created_at": now, "updated_at": now}
+        for task in tasks
+    ]
+    created = db.execute(insert(tables.Task).returning(*TASK_COLUMNS, sort_by_parameter_order=True), rows).mappings().all()
+    _set_tags(username, db, [(row["id"], row["tags"]) for row in created], replace=False)
+    return [dict(row) for row in created]
+
+def _flip_completed(username, db: Session, task_ids: list[int], completed: bool) -> int:
+    """
+    Sets completed on the tasks where it differs; returns how many flipped. The
+    WHERE is evaluated by the write itself (a concurrent writer's change is seen
+    once its row lock or SQLite's write lock is released), so the count can be
+    added to task_stats as is.
+    """
+    flipped = db.execute(
+        update(tables.Task)
+        .where(tables.Task.created_by == username, tables.Task.id.in_(task_ids), tables.Task.completed.is_not(completed))
+        .values(completed=completed)
+        .returning(tables.Task.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    return len(flipped)
+
+def _update_tasks(username, db: Session, updates: dict[int, schemas.TaskUpdate]) -> tuple[dict[int, dict], int]:
+    """
+    Applies {task_id: TaskUpdate}; returns the updated rows for the ids the user owns
+    and the change in their number of completed tasks.
+    """
+    completed_delta = 0
+    for value in (True, False):
+        task_ids = [task_id for task_id, task in updates.items() if task.completed is value]
+        if task_ids:
+            completed_delta += (1 if value else -1) * _flip_completed(username, db, task_ids, value)
+    owned = list(db.scalars(select(tables.Task.id).where(
+        tables.Task.created_by == username, tables.Task.id.in_(list(updates)))))
+    if not owned:
+        return {}, completed_delta
+    now = datetime.datetime.now()
+    # ORM bulk UPDATE by primary key: one executemany per distinct set of changed columns.
+    db.execute(update(tables.Task), [
+        {**updates[task_id].model_dump(exclude_none=True), "id": task_id, "updated_at": now, "updated_by": username}
+        for task_id in owned
+    ])
+    retagged = [(task_id, updates[task_id].tags) for task_id in owned if updates[task_id].tags is not None]
+    if retagged:
+        _set_tags(username, db, retagged)
+    rows = {row["id"]: dict(row) for row in db.execute(select(*TASK_COLUMNS).where(tables.Task.id.in_(owned))).mappings()}
+    return rows, completed_delta
+
+def _delete_tasks(username, db: Session, task_ids: list[int]) -> dict[int, bool]:
+    """Deletes the given tasks the user owns; returns {id: completed} for them. task_tags cascade."""
+    return dict(db.execute(delete(tables.Task).where(
+        tables.Task.created_by == username, tables.Task.id.in_(task_ids)).returning(tables.Task.id, tables.Task.completed)).all())
+
+"""
+Bulk import. Records are validated and loaded IMPORT_CHUNK_SIZE at a time, each chunk
+in its own transaction through _commit_changes (so sync clients, ETags and the cache
+see it like any other write). Postgres loads a chunk with COPY into a temporary
+staging table followed by one INSERT ... SELECT; other databases use one executemany.
+"""
+IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_ERRORS = 100
+IMPORT_COLUMNS = ("title", "tags", "due_date", "completed", "created_at", "updated_at")
+
+def _copy_tasks(username, db: Session, rows: list[dict]) -> list[tuple[int, str | None, bool]]:
+    db.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS task_import (title text, tags text, due_date timestamp, "
+        "completed boolean, created_at timestamp, updated_at timestamp) ON COMMIT DELETE ROWS"
+    ))
+    buffer = io.StringIO()
+    # Strings are quoted and None is written unquoted, which COPY reads as NULL.
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows([row[c] for c in IMPORT_COLUMNS] for row in rows)
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY task_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+    columns = ", ".join(IMPORT_COLUMNS)
+    return db.execute(text(
+        f"INSERT INTO tasks ({columns}, created_by, updated_by) "
+        f"SELECT {columns}, :username, :username FROM task_import RETURNING id, tags, completed"
+    ), {"username": username}).all()
+
+def _load_chunk(username, db: Session, rows: list[dict]) -> int:
+    if db.get_bind().dialect.name == "postgresql":
+        created = _copy_tasks(username, db, rows)
+    else:
+        rows = [{**row, "created_by": username, "updated_by": username} for row in rows]
+        created = db.execute(insert(tables.Task).returning(tables.Task.id, tables.Task.tags, tables.Task.completed), rows).all()
+    _set_tags(username, db, [(task_id, tags) for task_id, tags, _ in created], replace=False)
+    _commit_changes(username, db, upserted=[task_id for task_id, _, _ in created],
+                    created=[task_id for task_id, _, _ in created], stats_delta=(len(created), sum(int(completed) for _, _, completed in created)))
+    return len(created)
+
+def import_tasks(username, db: Session, records, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Imports (line, record) pairs from db/transfer.parse_records. Invalid rows are
+    skipped and reported; chunks loaded before a failure stay committed.
+    """
+    start = time.perf_counter()
+    imported, failed, errors, chunk = 0, 0, [], []
+    for line, record in records:
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            task = schemas.TaskImport.model_validate(record)
+        except ValueError as e:
+            failed += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line, "error": str(e)})
+            continue
+        now = datetime.datetime.now()
+        chunk.append({**task.model_dump(), "completed": bool(task.completed),
+                      "created_at": task.created_at or now, "updated_at": task.updated_at or task.created_at or now})
+        if len(chunk) == chunk_size:
+            imported += _load_chunk(username, db, chunk)
+            chunk = []
+    if chunk:
+        imported += _load_chunk(username, db, chunk)
+    seconds = time.perf_counter() - start
+    return {"imported": imported, "failed": failed, "errors": errors, "seconds": round(seconds, 3),
+            "rows_per_second": round(imported / seconds, 1) if seconds else 0.0}
+
+class VersionConflict(Exception):
+    """The collection changed since the version the client based its write on."""
+
+
+def _version_upsert(username, db: Session, expected_version: int | None = None):
+    """
+    INSERT ... ON CONFLICT that bumps the user's collection version and returns it.
+    With expected_version the bump only happens if the version still matches, so the
+    If-Match check is part of the write itself.
+    """
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    now = datetime.datetime.now()
+    return dialect_insert(tables.TaskVersion).values(created_by=username, version=1, updated_at=now).on_conflict_do_update(
+        index_elements=[tables.TaskVersion.created_by],
+        set_={"version": tables.TaskVersion.version + 1, "updated_at": now},
+        where=None if expected_version is None else tables.TaskVersion.version == expected_version,
+    ).returning(tables.TaskVersion.version)
+
+def _commit_changes(username, db: Session, upserted=(), deleted=(), expected_version: int | None = None,
+                    stats_delta: tuple[int, int] = (0, 0), created=()):
+    """
+    Records a write in the change log under a new collection version, applies
+    stats_delta (change in total, change in completed) to task_stats, then commits
+    and publishes the write to the event feed (created is the part of upserted that
+    is new). Bumping the version row locks it until commit, so one user's writes
+    commit in version order and a client holding version N never misses a change <= N.
+    Raises VersionConflict (after rolling back) if expected_version is stale.
+    """
+    changes = [(task_id, False) for task_id in upserted] + [(task_id, True) for task_id in deleted]
+    if changes:
+        now = datetime.datetime.now()
+        bump = _version_upsert(username, db, expected_version)
+        if db.get_bind().dialect.name == "postgresql":
+            # One round trip: the version bump runs as a CTE of the change-log insert.
+            bump = bump.cte("bump")
+            rows = values_clause(column("task_id", Integer), column("deleted", Boolean), name="changes").data(changes)
+            version = db.scalars(insert(tables.TaskChange).from_select(
+                ["created_by", "version", "task_id", "deleted", "created_at"],
+                select(literal(username), bump.c.version, rows.c.task_id, rows.c.deleted, literal(now, DateTime)),
+            ).returning(tables.TaskChange.version)).first()
+        else:
+            version = db.scalar(bump)
+            if version is not None:
+                db.execute(insert(tables.TaskChange), [
+                    {"created_by": username, "version": version, "task_id": task_id, "deleted": is_deleted, "created_at": now}
+                    for task_id, is_deleted in changes
+                ])
+        if version is None:
+            db.rollback()
+            raise VersionConflict()
+        created = set(created)
+        event = events.make_event(version, created=sorted(created), deleted=deleted,
+                                  updated=[task_id for task_id in upserted if task_id not in created])
+        if events.uses_notify(db):
+            events.notify(db, username, event)
+    if any(stats_delta):
+        db.execute(_stats_upsert(username, db, *stats_delta))
     db.commit()
-    db.refresh(db_task)
-    return db_task
+    if changes:
+        cache.invalidate(username, [task_id for task_id, _ in changes])
+        if not events.uses_notify(db):
+            events.publish(username, event)
 
+"""
+Task statistics. task_stats holds total and completed counts per user and every write
+transaction adjusts them through _commit_changes, so reading them is one primary-key
+lookup. Overdue depends on the clock, so it is counted at read time from the
+(created_by, completed, due_date) index. reconcile_stats recomputes the counters from
+the tasks table and fixes any drift.
+"""
 
-def update_task(username, db: Session, task_id: int, task: schemas.TaskUpdate):
-    db_task = get_task(username, db, task_id)
-    if not db_task:
-        return None
-    
-    if task.title is not None:
-        db_task.title = task.title
-    if task.tags is not None:
-        db_task.tags = task.tags
-    if task.completed is not None:
-        db_task.completed = task.completed
-    if task.due_date is not None:
-        db_task.due_date = task.due_date
+def _stats_upsert(username, db, total: int, completed: int):
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    now = datetime.datetime.now()
+    return dialect_insert(tables.TaskStats).values(
+        created_by=username, total=total, completed=completed, updated_at=now,
+    ).on_conflict_do_update(
+        index_elements=[tables.TaskStats.created_by],
+        set_={"total": tables.TaskStats.total + total, "completed": tables.TaskStats.completed + completed, "updated_at": now},
+    )
 
-    db_task.updated_at = datetime.datetime.now()
-    db_task.updated_by = username
+def get_stats(username, db: Session) -> dict:
+    row = db.execute(select(tables.TaskStats.total, tables.TaskStats.completed)
+                     .where(tables.TaskStats.created_by == username)).first()
+    total, completed = row if row else (0, 0)
+    overdue = db.scalar(select(func.count()).select_from(tables.Task).where(
+        tables.Task.created_by == username,
+        tables.Task.completed == False,  # noqa: E712 - must match the index column, not IS FALSE
+        tables.Task.due_date < datetime.datetime.now(),
+    )) if total > completed else 0
+    return {"total": total, "completed": completed, "open": total - completed, "overdue": overdue}
 
+def _reconcile_stats(db) -> list[str]:
+    """Rewrites the task_stats rows that differ from the tasks table; returns those usernames. Doesn't commit."""
+    actual = select(
+        tables.Task.created_by,
+        func.count().label("total"),
+        func.coalesce(func.sum(case((tables.Task.completed, 1), else_=0)), 0).label("completed"),
+    ).where(tables.Task.created_by.is_not(None)).group_by(tables.Task.created_by).subquery()
+    stats = tables.TaskStats
+    drifted = db.execute(
+        select(actual.c.created_by, actual.c.total, actual.c.completed)
+        .outerjoin(stats, stats.created_by == actual.c.created_by)
+        .where(or_(stats.created_by.is_(None), stats.total != actual.c.total, stats.completed != actual.c.completed))
+    ).all()
+    # Counters left behind for users who no longer have any tasks.
+    emptied = list(db.scalars(select(stats.created_by).where(
+        or_(stats.total != 0, stats.completed != 0),
+        stats.created_by.not_in(select(actual.c.created_by)),
+    )))
+    rows = [(username, total, completed) for username, total, completed in drifted] + [(u, 0, 0) for u in emptied]
+    if rows:
+        # Also runs on a plain Connection (migration 4), which has no get_bind().
+        dialect = db.get_bind().dialect if isinstance(db, Session) else db.dialect
+        dialect_insert = postgresql.insert if dialect.name == "postgresql" else sqlite.insert
+        now = datetime.datetime.now()
+        upsert = dialect_insert(stats)
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=[stats.created_by],
+            set_={"total": upsert.excluded.total, "completed": upsert.excluded.completed, "updated_at": now},
+        ), [{"created_by": u, "total": t, "completed": c, "updated_at": now} for u, t, c in rows])
+    return [username for username, _, _ in rows]
+
+def reconcile_stats(db: Session) -> list[str]:
+    fixed = _reconcile_stats(db)
     db.commit()
-    db.refresh(db_task)
+    for username in fixed:
+        cache.invalidate(username)
+    return fixed
 
-    return db_task
+def get_version(username, db: Session) -> tuple[int, datetime.datetime | None]:
+    """Current collection version and when it was bumped; (0, None) if never written."""
+    row = db.execute(select(tables.TaskVersion.version, tables.TaskVersion.updated_at)
+                     .where(tables.TaskVersion.created_by == username)).first()
+    return (row.version, row.updated_at) if row else (0, None)
 
-def delete_task(username, db: Session, task_id: int):
-    task = get_task(username,db, task_id)
-    if not task:
-        return False
-    db.delete(task)
+def get_changes(username, db: Session, since: int | None = None):
+    """
+    Tasks created or updated after version `since` plus ids deleted since then.
+    Without `since` every task is returned. The version is read first, so a write
+    racing with this call is at worst sent again on the next sync, never lost.
+
+    A token below the pruned part of the change log (see prune_changes) or above
+    the current version (the database was reset) also gets every task, with
+    full=True so the client replaces its copy instead of merging.
+    """
+    row = db.execute(select(tables.TaskVersion.version, tables.TaskVersion.pruned_version)
+                     .where(tables.TaskVersion.created_by == username)).first()
+    version, pruned_version = (row.version, row.pruned_version) if row else (0, 0)
+    if since is None or since < pruned_version or since > version:
+        return {"tasks": get_tasks(username, db), "deleted": [], "token": str(version), "full": True}
+    changed = set(db.scalars(select(tables.TaskChange.task_id).where(
+        tables.TaskChange.created_by == username, tables.TaskChange.version > since)))
+    tasks = _rows(db.query(tables.Task).filter(tables.Task.created_by == username, tables.Task.id.in_(changed)))
+    deleted = sorted(changed - {task["id"] for task in tasks})
+    return {"tasks": tasks, "deleted": deleted, "token": str(version), "full": False}
+
+def prune_changes(db: Session, retention: datetime.timedelta) -> int:
+    """
+    Deletes change-log rows older than retention (and rows from before created_at was
+    recorded) and raises each affected user's pruned_version to the highest version
+    removed, so a sync token from before then gets a full list. Returns the number
+    of rows deleted.
+    """
+    stale = or_(tables.TaskChange.created_at < datetime.datetime.now() - retention,
+                tables.TaskChange.created_at.is_(None))
+    horizons = db.execute(select(tables.TaskChange.created_by, func.max(tables.TaskChange.version))
+                          .where(stale).group_by(tables.TaskChange.created_by)).all()
+    for username, horizon in horizons:
+        db.execute(update(tables.TaskVersion)
+                   .where(tables.TaskVersion.created_by == username, tables.TaskVersion.pruned_version < horizon)
+                   .values(pruned_version=horizon))
+    deleted = db.execute(delete(tables.TaskChange).where(
+        stale, tables.TaskChange.version <= select(tables.TaskVersion.pruned_version).where(
+            tables.TaskVersion.created_by == tables.TaskChange.created_by).scalar_subquery()
+    )).rowcount
     db.commit()
+    return deleted
+
+def create_task(username, db: Session, task: schemas.TaskCreate):
+    created = _insert_tasks(username, db, [task])[0]
+    _commit_changes(username, db, upserted=[created["id"]], created=[created["id"]],
+                    stats_delta=(1, int(created["completed"])))
+    return created
+
+
+def update_task(username, db: Session, task_id: int, task: schemas.TaskUpdate, expected_version: int | None = None):
+    """
+    Single UPDATE ... RETURNING scoped to the owner; None if the task isn't theirs.
+    Changing `completed` is preceded by _flip_completed, whose row count is the
+    change for task_stats.
+    """
+    completed_delta = 0
+    if task.completed is not None:
+        completed_delta = (1 if task.completed else -1) * _flip_completed(username, db, [task_id], task.completed)
+    updated = db.execute(
+        update(tables.Task)
+        .where(tables.Task.id == task_id, tables.Task.created_by == username)
+        .values(**task.model_dump(exclude_none=True), updated_at=datetime.datetime.now(), updated_by=username)
+        .returning(*TASK_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).mappings().first()
+    if not updated:
+        return None
+    if task.tags is not None:
+        _set_tags(username, db, [(task_id, task.tags)])
+    _commit_changes(username, db, upserted=[task_id], expected_version=expected_version, stats_delta=(0, completed_delta))
+    return dict(updated)
+
+def delete_task(username, db: Session, task_id: int, expected_version: int | None = None):
+    deleted = _delete_tasks(username, db, [task_id])
+    if not deleted:
+        return False
+    _commit_changes(username, db, deleted=[task_id], expected_version=expected_version,
+                    stats_delta=(-1, -int(deleted[task_id])))
     return True
 
+def batch_tasks(username, db: Session, operations: list, atomic: bool = True, expected_version: int | None = None):
+    """
+    Runs mixed create/update/delete operations in one transaction: all creates as one
+    INSERT ... RETURNING, all updates as one executemany and all deletes as one
+    DELETE ... RETURNING. Operations are applied in that order, not in list order.
+
+    Updating or deleting a task the user doesn't own is reported as 404 for that item.
+    With atomic=True any failed item rolls back the whole batch.
+    """
+    creates = [(i, op) for i, op in enumerate(operations) if op.op == "create"]
+    updates = [(i, op) for i, op in enumerate(operations) if op.op == "update"]
+    deletes = [(i, op) for i, op in enumerate(operations) if op.op == "delete"]
+    results = [None] * len(operations)
+
+    if creates:
+        for (i, op), row in zip(creates, _insert_tasks(username, db, [op.task for _, op in creates])):
+            results[i] = {"index": i, "op": op.op, "status": 201, "id": row["id"], "task": row}
+    updated, completed_delta = _update_tasks(username, db, {op.id: op.task for _, op in updates}) if updates else ({}, 0)
+    for i, op in updates:
+        results[i] = {"index": i, "op": op.op, "status": 200, "id": op.id, "task": updated[op.id]} if op.id in updated \
+            else {"index": i, "op": op.op, "status": 404, "id": op.id, "error": "Task not found"}
+    deleted = _delete_tasks(username, db, [op.id for _, op in deletes]) if deletes else {}
+    for i, op in deletes:
+        results[i] = {"index": i, "op": op.op, "status": 204, "id": op.id} if op.id in deleted \
+            else {"index": i, "op": op.op, "status": 404, "id": op.id, "error": "Task not found"}
+
+    if atomic and any(r["status"] >= 400 for r in results):
+        db.rollback()
+        for r in results:
+            if r["status"] < 400:
+                r.update(status=424, task=None, error="Batch rolled back",
+                         id=None if r["op"] == "create" else r["id"])
+        return {"committed": False, "results": results}
+    _commit_changes(username, db,
+                    upserted=[r["id"] for r in results if r["status"] in (200, 201)],
+                    deleted=[r["id"] for r in results if r["status"] == 204],
+                    created=[r["id"] for r in results if r["status"] == 201],
+                    expected_version=expected_version,
+                    stats_delta=(len(creates) - len(deleted), completed_delta + sum(
+                        int(r["task"]["completed"]) for r in results if r["status"] == 201) - sum(map(int, deleted.values()))))
+    return {"committed": True, "results": results}
+
 def get_tasks_filtered(username, db: Session, query: str | None = None, completed: bool | None = None):
     q = db.query(tables.Task).filter(tables.Task.created_by == username)
     if query:
@@ -71,16 +548,23 @@ def get_tasks_filtered(username, db: Session, query: str | None = None, complete
         q = q.filter(tables.Task.completed == (1 if completed else 0))
     return q.all()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = hash_password(user.password)
+def create_user(db: Session, user: schemas.UserCreate, password_hash: str | None = None):
+    """Pass password_hash when it was already computed (the API hashes in a process pool)."""
+    hashed_password = password_hash or hash_password(user.password)
     db_user = tables.User(username=user.username, password_hash=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return True
 
+def get_user(db: Session, username: str):
+    return db.query(tables.User).filter(tables.User.username == username).first()
+
+def get_password_hash(db: Session, username: str) -> str | None:
+    return db.scalar(select(tables.User.password_hash).where(tables.User.username == username))
+
 def authenticate_user(db: Session, username: str, password: str):
-    db_user = db.query(tables.User).filter(tables.User.username == username).first()
+    db_user = get_user(db, username)
     if not db_user:
         return False
     if not verify_password(password, db_user.password_hash):
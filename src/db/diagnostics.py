@@ -0,0 +1,102 @@
+import datetime
+import logging
+import os
+import re
+import time
+from sqlalchemy import event
+from . import metrics
+
+"""
+Opt-in SQL diagnostics (DB_DIAGNOSTICS=true), hooked into the engines by db/database.py.
+
+* Statements slower than SLOW_QUERY_MS are logged with redacted parameters, the route
+  and username of the request that issued them and the query plan: EXPLAIN QUERY PLAN
+  on SQLite; on Postgres EXPLAIN (ANALYZE, BUFFERS) for plain SELECTs and EXPLAIN for
+  everything else (including WITH ... INSERT), since ANALYZE runs the statement a
+  second time. The ANALYZE also runs in a SAVEPOINT that is always rolled back, so
+  a SELECT that calls a function such as pg_notify() leaves nothing behind.
+* A request that runs the same statement N_PLUS_ONE_THRESHOLD times gets a warning,
+  which is what an N+1 loop looks like from the database's side.
+
+The request context comes from metrics.current_request, set by MetricsMiddleware.
+"""
+ENABLED = os.getenv("DB_DIAGNOSTICS", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+logger = logging.getLogger(__name__)
+
+def redact(parameters):
+    """Keeps numbers, booleans, dates and NULLs; replaces text (titles, passwords) with its type and length."""
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)(redact(value) for value in parameters)
+    if parameters is None or isinstance(parameters, (bool, int, float, datetime.date, datetime.datetime)):
+        return parameters
+    if isinstance(parameters, (str, bytes)):
+        return f"<{type(parameters).__name__} len={len(parameters)}>"
+    return f"<{type(parameters).__name__}>"
+
+def is_read_only(statement: str) -> bool:
+    """A plain SELECT; a WITH can hold INSERT/UPDATE/DELETE (the change-log statement does)."""
+    return re.match(r"\s*SELECT\b", statement, re.IGNORECASE) is not None
+
+def explain_prefix(dialect: str, statement: str) -> str | None:
+    if dialect == "sqlite":
+        return "EXPLAIN QUERY PLAN "
+    if dialect == "postgresql":
+        return "EXPLAIN (ANALYZE, BUFFERS) " if is_read_only(statement) else "EXPLAIN "
+    return None
+
+def explain(conn, statement: str, parameters) -> list[str]:
+    """Plan lines for statement, run on a separate cursor of the same DBAPI connection."""
+    prefix = explain_prefix(conn.dialect.name, statement)
+    if prefix is None:
+        return []
+    analyze = "ANALYZE" in prefix
+    cursor = conn.connection.cursor()
+    try:
+        if analyze:
+            cursor.execute("SAVEPOINT diagnostics_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [str(row[-1]) for row in cursor.fetchall()]
+        finally:
+            if analyze:
+                cursor.execute("ROLLBACK TO SAVEPOINT diagnostics_explain")
+                cursor.execute("RELEASE SAVEPOINT diagnostics_explain")
+    finally:
+        cursor.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["diagnostics_start"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info.pop("diagnostics_start")) * 1000
+    request = metrics.current_request.get()
+    if request is not None:
+        count = request.statement_counts[statement] = request.statement_counts.get(statement, 0) + 1
+        if count == N_PLUS_ONE_THRESHOLD:
+            logger.warning("Possible N+1: %s %s (user %s) ran this statement %d times:\n%s",
+                           request.method, request.route, request.path_params.get("username"), count, statement)
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    plan = []
+    if not executemany and re.match(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", statement, re.IGNORECASE):
+        try:
+            plan = explain(conn, statement, parameters)
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {e}"]
+    logger.warning(
+        "Slow query (%.1f ms) from %s %s (user %s)\n%s\nparameters: %r\n%s",
+        elapsed_ms,
+        request.method if request else "-", request.route if request else "-",
+        request.path_params.get("username") if request else "-",
+        statement, redact(parameters), "\n".join(plan),
+    )
+
+def enable(engine):
+    """Hooks the slow-query log and N+1 detection into a sync Engine (for async engines pass .sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
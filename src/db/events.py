@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from sqlalchemy import text
+
+"""
+Change feed behind GET /tasks/{username}/events (Server-Sent Events).
+
+crud._commit_changes publishes one event per committed write: the new collection
+version and the ids that were created, updated and deleted. Events only say that
+something changed; clients fetch the rows with /changes?since=<their token>, which
+also covers anything they missed while disconnected.
+
+Every connection has its own bounded queue (EVENT_QUEUE_SIZE). A subscriber that
+falls that far behind is dropped: its stream ends with a "dropped" event and the
+client reconnects and resyncs, so one slow reader never holds up the writers or the
+other readers.
+
+Within one process publish() hands events straight to the subscribers. With several
+workers on Postgres set EVENTS_PG_NOTIFY=true: the event is then sent with
+pg_notify() inside the write's own transaction (so it only goes out if the write
+commits) and every worker's listen() thread delivers it to its local subscribers.
+"""
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+MAX_SUBSCRIBERS_PER_USER = int(os.getenv("MAX_SUBSCRIBERS_PER_USER", "20"))
+PG_NOTIFY = os.getenv("EVENTS_PG_NOTIFY", "false").lower() in ("1", "true", "yes")
+NOTIFY_CHANNEL = "task_events"
+NOTIFY_PAYLOAD_LIMIT = 7900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+
+DROPPED = object()
+
+logger = logging.getLogger(__name__)
+
+class TooManySubscribers(Exception):
+    pass
+
+class Subscription:
+    def __init__(self, username: str, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.username = username
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def offer(self, event: dict):
+        """Runs on the subscriber's event loop."""
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(DROPPED)
+
+class Broker:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = {}  # username -> set of Subscription
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, username: str) -> Subscription:
+        """Call from the event loop that will read the subscription."""
+        subscription = Subscription(username, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            subscribers = self.subscribers.setdefault(username, set())
+            if len(subscribers) >= MAX_SUBSCRIBERS_PER_USER:
+                raise TooManySubscribers()
+            subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self.subscribers.get(subscription.username)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.username]
+            if subscription.dropped:
+                self.dropped += 1
+
+    def deliver(self, username: str, event: dict):
+        """Queues event for every local subscriber of username; safe to call from any thread."""
+        with self._lock:
+            subscribers = list(self.subscribers.get(username, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:  # its event loop is closed
+                self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"subscribers": sum(map(len, self.subscribers.values())), "users": len(self.subscribers),
+                    "dropped": self.dropped}
+
+broker = Broker()
+
+def make_event(version: int, created=(), updated=(), deleted=()) -> dict:
+    return {"version": version, "created": list(created), "updated": list(updated), "deleted": list(deleted)}
+
+def notify(db, username: str, event: dict):
+    """Sends event through pg_notify in db's transaction (EVENTS_PG_NOTIFY on Postgres)."""
+    payload = json.dumps({"username": username, "event": event})
+    if len(payload.encode("utf-8")) > NOTIFY_PAYLOAD_LIMIT:
+        # Clients fetch the rows from /changes anyway, so the id lists can be left out.
+        payload = json.dumps({"username": username, "event": make_event(event["version"])})
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+
+def uses_notify(db) -> bool:
+    return PG_NOTIFY and db.get_bind().dialect.name == "postgresql"
+
+def publish(username: str, event: dict):
+    """Delivers a committed write's event in this process (when it is not sent through pg_notify)."""
+    broker.deliver(username, event)
+
+def listen(engine, stop: threading.Event, poll_seconds: float = 1.0):
+    """Blocking loop (run it in a thread) that delivers NOTIFY events from every worker to local subscribers."""
+    while not stop.is_set():
+        try:
+            raw = engine.raw_connection()
+            raw.detach()  # kept out of the pool for as long as it listens
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            while not stop.is_set():
+                if select.select([conn], [], [], poll_seconds) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    message = json.loads(conn.notifies.pop(0).payload)
+                    broker.deliver(message["username"], message["event"])
+            conn.close()
+        except Exception:
+            logger.exception("Event listener failed, reconnecting")
+            stop.wait(poll_seconds)
@@ -0,0 +1,194 @@
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.routing import Match
+
+"""
+Request and database metrics in the Prometheus text format, served by GET /metrics.
+
+MetricsMiddleware resolves the route template of every HTTP request, tracks it as in
+flight and records its status and latency. While the request runs, a RequestStats
+object sits in a context variable; instrument(engine) adds every statement, its
+duration and the time spent waiting for a pooled connection to it. Context variables
+follow the request into the threadpool and into AsyncSession.run_sync.
+"""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+class RequestStats:
+    __slots__ = ("method", "route", "path_params", "queries", "db_seconds", "pool_wait_seconds", "statement_counts")
+
+    def __init__(self, method: str, route: str, path_params: dict):
+        self.method = method
+        self.route = route
+        self.path_params = path_params
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.statement_counts = {}  # filled by db/diagnostics.py when enabled
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+class Metric:
+    """One metric family. Histograms keep per-bucket counts plus the sum and count for each label set."""
+
+    def __init__(self, name: str, kind: str, help: str, labels: tuple = (), buckets: tuple = ()):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def observe(self, labels: tuple, value: float):
+        with _lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value:g}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), labels + (f'{bound:g}',))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+_lock = threading.Lock()
+
+REQUESTS = Metric("http_requests_total", "counter", "HTTP requests by route and status.", ("method", "route", "status"))
+LATENCY = Metric("http_request_duration_seconds", "histogram", "HTTP request latency.", ("method", "route"), LATENCY_BUCKETS)
+IN_FLIGHT = Metric("http_requests_in_flight", "gauge", "HTTP requests currently being served.", ("method", "route"))
+REQUEST_QUERIES = Metric("http_request_db_queries", "histogram", "SQL statements per request.", ("method", "route"), QUERY_BUCKETS)
+REQUEST_DB_TIME = Metric("http_request_db_seconds", "histogram", "Time spent executing SQL per request.", ("method", "route"), LATENCY_BUCKETS)
+REQUEST_POOL_WAIT = Metric("http_request_db_pool_wait_seconds", "histogram", "Time spent waiting for a pooled connection per request.", ("method", "route"), LATENCY_BUCKETS)
+QUERIES = Metric("db_queries_total", "counter", "SQL statements executed, including those outside requests.")
+QUERY_TIME = Metric("db_query_seconds_total", "counter", "Total time spent executing SQL.")
+POOL_WAIT = Metric("db_pool_wait_seconds", "histogram", "Time to check a connection out of the pool.", (), LATENCY_BUCKETS)
+
+METRICS = [REQUESTS, LATENCY, IN_FLIGHT, REQUEST_QUERIES, REQUEST_DB_TIME, REQUEST_POOL_WAIT, QUERIES, QUERY_TIME, POOL_WAIT]
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_start")
+    QUERIES.inc()
+    QUERY_TIME.inc(amount=elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+def instrument(engine):
+    """Hooks statement timing and pool checkout wait into a sync Engine (for async engines pass .sync_engine)."""
+    if getattr(engine, "_metrics_instrumented", False):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    # Every Connection gets its DBAPI connection through raw_connection(), so timing it
+    # captures the wait for a free pool slot (and new connections). It survives dispose().
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        start = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            elapsed = time.perf_counter() - start
+            POOL_WAIT.observe((), elapsed)
+            stats = current_request.get()
+            if stats is not None:
+                stats.pool_wait_seconds += elapsed
+
+    engine.raw_connection = timed_raw_connection
+    engine._metrics_instrumented = True
+
+def _resolve_route(scope) -> tuple[str, dict]:
+    """The route template (e.g. /tasks/{username}/{task_id}) that will serve scope, so labels stay bounded."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"]), child_scope.get("path_params", {})
+    return "<unmatched>", {}
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route, path_params = _resolve_route(scope)
+        stats = RequestStats(scope["method"], route, path_params)
+        labels = (stats.method, route)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = current_request.set(stats)
+        IN_FLIGHT.inc(labels)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.inc(labels, -1)
+            current_request.reset(token)
+            REQUESTS.inc(labels + (str(status),))
+            LATENCY.observe(labels, elapsed)
+            REQUEST_QUERIES.observe(labels, stats.queries)
+            REQUEST_DB_TIME.observe(labels, stats.db_seconds)
+            REQUEST_POOL_WAIT.observe(labels, stats.pool_wait_seconds)
+
+def _snapshot_lines(name: str, kind: str, help: str, label: str, values: dict) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines.extend(f'{name}{{{label}="{key}"}} {value:g}' for key, value in values.items())
+    return lines
+
+def render(pool_status: dict, cache_stats: dict) -> str:
+    """All metrics plus the current pool usage and read-cache counters, as Prometheus text."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    pool = {key: pool_status[key] for key in ("size", "checked_out", "overflow") if key in pool_status}
+    if pool:
+        lines.extend(_snapshot_lines("db_pool_connections", "gauge", "Connection pool state.", "state", pool))
+    events = {key: cache_stats[key] for key in ("hits", "misses", "evictions", "expirations", "invalidations") if key in cache_stats}
+    lines.extend(_snapshot_lines("task_cache_events_total", "counter", "Read cache events.", "event", events))
+    lines.extend(["# HELP task_cache_entries Entries in the read cache.", "# TYPE task_cache_entries gauge",
+                  f"task_cache_entries {cache_stats.get('size', 0)}"])
+    return "\n".join(lines) + "\n"
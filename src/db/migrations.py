@@ -0,0 +1,73 @@
+import datetime
+from sqlalchemy import delete, insert, inspect, select, text
+from . import crud, schemas, search, tables
+
+"""
+Versioned schema migrations. create_all only creates missing tables, so indexes on
+existing tables and data backfills live here. Each migration runs once, in its own
+transaction, and is recorded in schema_migrations.
+"""
+
+def backfill_task_tags(conn):
+    conn.execute(delete(tables.TaskTag))
+    rows = conn.execute(
+        select(tables.Task.id, tables.Task.created_by, tables.Task.tags)
+        .where(tables.Task.tags.is_not(None), tables.Task.created_by.is_not(None))
+        .execution_options(yield_per=1000)
+    )
+    for chunk in rows.partitions():
+        values = [
+            {"task_id": task_id, "tag": tag, "created_by": created_by}
+            for task_id, created_by, tags in chunk
+            for tag in schemas.parse_tags(tags)
+        ]
+        if values:
+            conn.execute(insert(tables.TaskTag), values)
+
+
+def create_owner_indexes(conn):
+    for index in tables.Task.__table__.indexes:
+        if index.name.startswith("ix_tasks_owner_"):
+            index.create(conn, checkfirst=True)
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ANALYZE tasks"))
+
+
+def backfill_task_stats(conn):
+    crud._reconcile_stats(conn)
+
+
+def add_change_log_retention(conn):
+    # create_all already added the columns on a new database.
+    columns = {name: {c["name"] for c in inspect(conn).get_columns(name)} for name in ("task_versions", "task_changes")}
+    if "pruned_version" not in columns["task_versions"]:
+        conn.execute(text("ALTER TABLE task_versions ADD COLUMN pruned_version INTEGER NOT NULL DEFAULT 0"))
+    if "created_at" not in columns["task_changes"]:
+        conn.execute(text("ALTER TABLE task_changes ADD COLUMN created_at TIMESTAMP"))
+
+
+MIGRATIONS = [
+    (1, "search indexes", search.install),
+    (2, "backfill task_tags", backfill_task_tags),
+    (3, "owner-scoped task indexes", create_owner_indexes),
+    (4, "backfill task_stats", backfill_task_stats),
+    (5, "owner due-date index", create_owner_indexes),
+    (6, "change-log retention columns", add_change_log_retention),
+]
+
+
+def migrate(engine):
+    with engine.connect() as conn:
+        applied = set(conn.scalars(select(tables.SchemaMigration.version)))
+    for version, name, upgrade in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                # Serializes concurrent workers; the loser re-checks and skips.
+                conn.execute(text("SELECT pg_advisory_xact_lock(20251001)"))
+                if conn.scalar(select(tables.SchemaMigration.version).where(tables.SchemaMigration.version == version)):
+                    continue
+            upgrade(conn)
+            conn.execute(insert(tables.SchemaMigration).values(
+                version=version, name=name, applied_at=datetime.datetime.now()))
@@ -1,8 +1,15 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, Literal, Optional, List, Union
 from datetime import datetime
 from uuid import UUID
 
+def parse_tags(tags: str | None) -> list[str]:
+    """Splits a comma-separated tag string into unique, lowercased tags."""
+    if not tags:
+        return []
+    return list(dict.fromkeys(t.strip().lower() for t in tags.split(",") if t.strip()))
+
+
 class TaskBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=140)
     tags: Optional[str] = None
@@ -38,4 +45,91 @@ class UserCreate(BaseModel):
 
 class UserLogin(BaseModel):
     username: str
-    password: str
\ No newline at end of file
+    password: str
+
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+
+class BatchCreate(BaseModel):
+    op: Literal["create"]
+    task: TaskCreate
+
+
+class BatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: int
+    task: TaskUpdate
+
+
+class BatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+BatchOperation = Annotated[Union[BatchCreate, BatchUpdate, BatchDelete], Field(discriminator="op")]
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=1000)
+    # all_or_nothing rolls everything back if any operation fails; best_effort commits the rest.
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing"
+
+    @model_validator(mode="after")
+    def check_unique_ids(self):
+        ids = [op.id for op in self.operations if op.op != "create"]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Each task id may appear in at most one update or delete operation")
+        return self
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    task: Optional[TaskResponse] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchItemResult]
+
+
+class TaskStats(BaseModel):
+    total: int
+    completed: int
+    open: int
+    overdue: int
+
+
+class TaskChanges(BaseModel):
+    tasks: List[TaskResponse]
+    deleted: List[int]
+    # Opaque sync token; pass it back as ?since= to get the next delta.
+    token: str
+    # True when tasks is the complete list (no since, or a token older than the change log's retention).
+    full: bool = False
+
+
+class TaskImport(TaskBase):
+    # Kept when moving tasks between environments; default to the import time.
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    # The first crud.MAX_IMPORT_ERRORS errors.
+    errors: List[ImportRowError]
+    seconds: float
+    rows_per_second: float
@@ -0,0 +1,102 @@
+import re
+from sqlalchemy import Column, Integer, MetaData, String, Table, case, func, inspect, literal_column, or_, text
+from . import tables
+
+"""
+Task search backends behind one API: filter_tasks(q, dialect, query, mode).
+
+Postgres: substring search is ILIKE backed by pg_trgm GIN indexes, prefix and fulltext
+search use a GIN index on a tsvector expression and are ranked with ts_rank.
+SQLite: prefix and fulltext search use an FTS5 table kept in sync by triggers and are
+ranked with bm25. Substring search stays a LIKE over the user's rows.
+"""
+SEARCH_MODES = ("prefix", "substring", "fulltext")
+
+# Must stay identical to the expression in the GIN index, otherwise the planner won't use it.
+PG_TSVECTOR = "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(tags, ''))"
+
+PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_title_trgm ON tasks USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_tags_trgm ON tasks USING gin (tags gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_tasks_search ON tasks USING gin (({PG_TSVECTOR}))",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE tasks_fts USING fts5(title, tags, content='tasks', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, tags) VALUES (new.id, new.title, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, tags) VALUES ('delete', old.id, old.title, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, tags ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, tags) VALUES ('delete', old.id, old.title, old.tags);
+        INSERT INTO tasks_fts(rowid, title, tags) VALUES (new.id, new.title, new.tags);
+    END""",
+    "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')",
+]
+
+# Not part of Base.metadata, so create_all leaves the virtual table to install().
+tasks_fts = Table("tasks_fts", MetaData(), Column("rowid", Integer), Column("title", String), Column("tags", String))
+
+
+def install(conn):
+    """Creates the search indexes for the connection's dialect. Safe to run more than once."""
+    if conn.dialect.name == "postgresql":
+        for ddl in PG_DDL:
+            conn.execute(text(ddl))
+    elif conn.dialect.name == "sqlite" and not inspect(conn).has_table("tasks_fts"):
+        for ddl in SQLITE_DDL:
+            conn.execute(text(ddl))
+
+
+def _terms(query: str):
+    return re.findall(r"\w+", query)
+
+
+def _escape_like(query: str) -> str:
+    return query.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def filter_tasks(q, dialect: str, query: str, mode: str = "substring", ranked: bool = True):
+    """
+    Restricts the task query q to matches for query. With ranked=True the result is
+    ordered by relevance; pass ranked=False when the caller applies its own ordering.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    terms = _terms(query)
+    if mode != "substring" and not terms:
+        mode = "substring"
+
+    if mode == "substring":
+        pattern = f"%{_escape_like(query)}%"
+        title_match = tables.Task.title.ilike(pattern, escape="!")
+        q = q.filter(or_(title_match, tables.Task.tags.ilike(pattern, escape="!")))
+        if not ranked:
+            return q
+        if dialect == "postgresql":
+            return q.order_by(func.greatest(
+                func.similarity(tables.Task.title, query),
+                func.similarity(func.coalesce(tables.Task.tags, ""), query),
+            ).desc(), tables.Task.id)
+        return q.order_by(case((title_match, 0), else_=1), tables.Task.id)
+
+    if dialect == "postgresql":
+        document = literal_column(PG_TSVECTOR)
+        if mode == "prefix":
+            tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{t}:*" for t in terms))
+        else:
+            tsquery = func.plainto_tsquery(literal_column("'simple'"), " ".join(terms))
+        q = q.filter(document.op("@@")(tsquery))
+        return q.order_by(func.ts_rank(document, tsquery).desc(), tables.Task.id) if ranked else q
+
+    if dialect == "sqlite":
+        suffix = "*" if mode == "prefix" else ""
+        match = " ".join(f'"{t}"{suffix}' for t in terms)
+        fts = literal_column("tasks_fts")
+        q = q.join(tasks_fts, tasks_fts.c.rowid == tables.Task.id).filter(fts.op("MATCH")(match))
+        return q.order_by(func.bm25(fts), tables.Task.id) if ranked else q
+
+    raise ValueError(f"Search mode '{mode}' is not supported on {dialect}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from .database import Base
 
@@ -14,9 +14,64 @@ class Task(Base):
     updated_at = Column(DateTime, nullable=False)
     updated_by = Column(String, nullable=True)
 
+    # Every query is scoped to one owner, so created_by leads each index.
+    __table_args__ = (
+        Index("ix_tasks_owner_id", "created_by", "id"),
+        Index("ix_tasks_owner_completed_due", "created_by", "completed", "due_date"),
+        Index("ix_tasks_owner_updated", "created_by", "updated_at", "id"),
+        Index("ix_tasks_owner_due", "created_by", "due_date", "id"),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
     username = Column(String, unique=True, nullable=False)
-    password_hash = Column(String, nullable=False)
\ No newline at end of file
+    password_hash = Column(String, nullable=False)
+
+
+class TaskTag(Base):
+    """One row per (task, normalized tag); Task.tags keeps the string the user typed."""
+    __tablename__ = "task_tags"
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String, primary_key=True)
+    created_by = Column(String, nullable=False)
+    __table_args__ = (Index("ix_task_tags_owner_tag", "created_by", "tag"),)
+
+
+class TaskVersion(Base):
+    """Per-user collection version, bumped once by every write transaction."""
+    __tablename__ = "task_versions"
+    created_by = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    # Change-log rows up to this version may have been pruned; older sync tokens get a full list.
+    pruned_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class TaskStats(Base):
+    """Per-user task counters, kept in step by crud's write transactions (see crud.get_stats)."""
+    __tablename__ = "task_stats"
+    created_by = Column(String, primary_key=True)
+    total = Column(Integer, nullable=False)
+    completed = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class TaskChange(Base):
+    """Change log for delta sync; rows with deleted=True are tombstones."""
+    __tablename__ = "task_changes"
+    id = Column(Integer, primary_key=True)
+    created_by = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
+    task_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, nullable=False)
+    created_at = Column(DateTime, nullable=True)  # NULL for rows written before retention existed
+    __table_args__ = (Index("ix_task_changes_owner_version", "created_by", "version"),)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False)
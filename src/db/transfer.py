@@ -0,0 +1,132 @@
+import codecs
+import csv
+import datetime
+import io
+import queue
+import threading
+import orjson
+
+"""
+Export and import formats for moving a user's tasks between environments.
+
+Export encodes rows from crud.iter_tasks into NDJSON or CSV chunks. Import reads the
+request body through ChunkReader (a file object fed from the event loop through a
+bounded queue) and yields one (line number, record) pair per row, so neither side
+ever holds more than a chunk in memory. A record is a dict, or an error message when
+the row could not be parsed.
+"""
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_FIELDS = ("id", "title", "tags", "due_date", "completed", "created_at", "updated_at", "created_by", "updated_by")
+EXPORT_CHUNK_ROWS = 500
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+def export_chunks(tasks, format: str):
+    """Encodes task dicts as NDJSON lines or CSV rows (with a header), EXPORT_CHUNK_ROWS rows per chunk."""
+    if format == "ndjson":
+        chunk = []
+        for task in tasks:
+            chunk.append(orjson.dumps(task, option=orjson.OPT_UTC_Z) + b"\n")
+            if len(chunk) == EXPORT_CHUNK_ROWS:
+                yield b"".join(chunk)
+                chunk = []
+        yield b"".join(chunk)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for i, task in enumerate(tasks, 1):
+        writer.writerow([_csv_value(task[field]) for field in EXPORT_FIELDS])
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+class ChunkReader(io.RawIOBase):
+    """
+    Readable file object over byte chunks put() by another thread; None ends the stream.
+    The queue is bounded, so a fast upload waits for the loader instead of piling up.
+    """
+
+    def __init__(self, max_chunks: int = 8):
+        self.chunks = queue.Queue(maxsize=max_chunks)
+        self.done = threading.Event()
+        self.pending = b""
+
+    def put(self, chunk: bytes | None):
+        """Blocks while the queue is full; returns False once the reader has stopped consuming."""
+        while not self.done.is_set():
+            try:
+                self.chunks.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.done.set()
+                return 0
+            self.pending = chunk
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        self.done.set()
+        super().close()
+
+def _decoded_lines(lines, counter: list[int]):
+    """Decodes byte lines as UTF-8 (without a leading BOM), counting them in counter[0]."""
+    for line in lines:
+        if counter[0] == 0 and line.startswith(codecs.BOM_UTF8):
+            line = line[len(codecs.BOM_UTF8):]
+        counter[0] += 1
+        yield line.decode("utf-8")
+
+def parse_records(raw: io.RawIOBase, format: str):
+    """
+    Yields (line, record) for each data row of an NDJSON or CSV stream. An NDJSON line
+    that isn't valid UTF-8 is reported like any other bad line. CSV records can span
+    lines, so there a decoding or CSV syntax error is reported once and ends the
+    stream; the rows before it are still imported.
+    """
+    lines = io.BufferedReader(raw)
+    if format == "ndjson":
+        for line_no, line in enumerate(lines, 1):
+            if line_no == 1 and line.startswith(codecs.BOM_UTF8):
+                line = line[len(codecs.BOM_UTF8):]
+            if not line.strip():
+                continue
+            try:
+                record = orjson.loads(line)  # also rejects invalid UTF-8
+            except orjson.JSONDecodeError as e:
+                yield line_no, f"Invalid JSON: {e}"
+                continue
+            yield line_no, record if isinstance(record, dict) else "Expected a JSON object"
+        return
+    counter = [0]
+    reader = csv.DictReader(_decoded_lines(lines, counter))
+    try:
+        for record in reader:
+            if None in record:
+                yield reader.line_num, "More values than header columns"
+                continue
+            # CSV has no NULL; an empty cell means the field was not set.
+            yield reader.line_num, {key: value for key, value in record.items() if value not in ("", None)}
+    except UnicodeDecodeError as e:
+        yield counter[0], f"Invalid UTF-8 ({e.reason}); the rest of the file was not read"
+    except csv.Error as e:
+        yield counter[0], f"Invalid CSV ({e}); the rest of the file was not read"
@@ -2,24 +2,43 @@ import tkinter as tk
 from tkinter import ttk, messagebox, Toplevel, Menu
 from tkcalendar import DateEntry
 from datetime import datetime
-import requests
 import asyncio
-import aiohttp
+import contextlib
+import logging
+from gui_cache import TaskCache
+from gui_client import ApiClient, ApiError
+from gui_loop import AsyncBridge
+from gui_render import SORT_COLUMNS, TaskIndex, TreeRenderer
 
 API_URL = "http://localhost:8000/tasks"
+SEARCH_DEBOUNCE_MS = 150
+EVENT_RECONNECT_MAX_SECONDS = 30
+FILTERS = {"all": "All", "completed": "Completed", "not_completed": "Not Completed"}
 
 class TaskManagerApp:
-    def __init__(self, root, current_user):
+    def __init__(self, root, bridge, current_user, access_token=None):
         self.root = root
+        self.bridge = bridge
         self.current_user = current_user
+        self.client = ApiClient(API_URL, headers=self.auth_headers(access_token), reauthenticate=self.log_in_again)
+        self.bridge.on_shutdown(self.client.close)
         self.root.title("Unimicro Task Manager")
 
-        self.all_tasks = []
-        self.cached_tasks = {}
-        self.sort_column = "due_date"
-        self.sort_reverse = False
+        # Start from the last session's snapshot; the first sync then only fetches what changed since.
+        self.disk_cache = TaskCache.for_user(API_URL, current_user)
+        tasks, self.sync_token, prefs = self.disk_cache.load()
+        self.cached_tasks = {t["id"]: t for t in tasks}
+        self._write_seq = 0
+        self._latest_write = {}  # task id -> seq of its newest unsettled write
+        self._skipped_changes = set()  # ids a sync skipped while our write was in flight; refetched once it settles
+        self._next_temp_id = -1  # local ids for created tasks until the server assigns one
+        self.sort_column = prefs.get("sort_column") if prefs.get("sort_column") in SORT_COLUMNS else "due_date"
+        self.sort_reverse = bool(prefs.get("sort_reverse", False))
         self.search_var = tk.StringVar()
-        self.filter_var = tk.StringVar(value="all")
+        self.filter_var = tk.StringVar(value=prefs.get("filter") if prefs.get("filter") in FILTERS else "all")
+        self.index = TaskIndex()
+        self.index.load(self.cached_tasks.values())
+        self._search_after_id = None
 
         header = ttk.Frame(root)
         header.pack(fill="x", padx=10, pady=10)
@@ -35,21 +54,28 @@ class TaskManagerApp:
         ttk.Label(control_frame, text="Search:").pack(side="left")
         search_entry = ttk.Entry(control_frame, textvariable=self.search_var, width=25)
         search_entry.pack(side="left", padx=(5, 15))
-        self.search_var.trace_add("write", lambda *args: self.filter_and_render_tasks())
+        self.search_var.trace_add("write", lambda *args: self.schedule_search())
 
         ttk.Label(control_frame, text="Filter:").pack(side="left")
-        for value, text in [("all", "All"), ("completed", "Completed"), ("not_completed", "Not Completed")]:
+        for value, text in FILTERS.items():
             ttk.Radiobutton(
                 control_frame, text=text, variable=self.filter_var, value=value,
-                command=self.filter_and_render_tasks
+                command=self.change_filter
             ).pack(side="left", padx=2)
 
         columns = ("title", "tags", "due_date", "completed")
-        self.tree = ttk.Treeview(root, columns=columns, show="headings", height=10)
+        tree_frame = ttk.Frame(root)
+        tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings", height=10)
         for col in columns:
             self.tree.heading(col, text=col.title(), command=lambda c=col: self.sort_by_column(c))
             self.tree.column(col, width=150, anchor="center")
-        self.tree.pack(fill="both", expand=True, padx=10, pady=10)
+        self.tree.tag_configure("overdue", background="#ffcccc")
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.renderer = TreeRenderer(self.tree)
 
         self.tree.bind("<Double-1>", self.toggle_complete)
         self.tree.bind("<Button-3>", self.show_context_menu)
@@ -60,86 +86,138 @@ class TaskManagerApp:
         self.context_menu.add_command(label="Edit Task", command=self.open_edit_modal)
         self.context_menu.add_command(label="Delete Task", command=self.delete_task)
 
-        self.root.after(100, lambda: self.run_async(self.load_tasks_from_api))
+        self.root.protocol("WM_DELETE_WINDOW", self.root.destroy)
+        self.filter_and_render_tasks()
+        self._sync_task = None
+        self._merge_lock = asyncio.Lock()
+        self.run_async(self.follow_changes)
+
+    @staticmethod
+    def auth_headers(access_token):
+        return {"Authorization": f"Bearer {access_token}"} if access_token else {}
+
+    async def log_in_again(self):
+        """
+        Called by the client when the server answers 401 (the session token expired, or
+        the server restarted with a new secret). Asks for the password again and
+        returns headers with the new token; requests that failed meanwhile are resent.
+        """
+        loop = asyncio.get_running_loop()
+        renewed = loop.create_future()
+
+        def on_success(auth):
+            loop.call_soon_threadsafe(renewed.set_result, auth.access_token)
+
+        await self.bridge.run_in_tk(AuthApp, self.root, self.bridge, on_success, self.current_user)
+        return self.auth_headers(await renewed)
 
     def run_async(self, coro_func, *args):
-        """Run coroutine without blocking Tkinter"""
-        asyncio.ensure_future(coro_func(*args))
+        """Run coroutine on the asyncio thread without blocking Tkinter"""
+        return self.bridge.submit(coro_func(*args))
 
     async def api_request(self, method, endpoint="", **kwargs):
-        url = f"{API_URL}{endpoint}"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.request(method, url, **kwargs) as resp:
-                    resp.raise_for_status()
-                    if resp.content_type == "application/json":
-                        return await resp.json()
-                    return None
-        except aiohttp.ClientError as e:
-            self.root.after(0, lambda e=e: messagebox.showerror("API Error", str(e)))
-        
-    def update_tree(self, tasks):
-        self.tree.delete(*self.tree.get_children())
-        for t in tasks:
-            self.tree.insert("", "end", iid=t["id"], values=(t["title"], t.get("tags", ""), t.get("due_date", ""), "✅" if t["completed"] else "⚪"))
-
+            return await self.client.request(method, endpoint, **kwargs)
+        except ApiError as e:
+            self.bridge.call_in_tk(messagebox.showerror, "API Error", str(e))
+
+    def on_tree_scroll(self, first, last):
+        """Scrollbar callback; attaches more rows once the view nears the end of what is rendered."""
+        self.scrollbar.set(first, last)
+        if float(last) > 0.9:
+            self.renderer.grow()
+
+    async def follow_changes(self):
+        """
+        Subscribes to the server's event feed and syncs when connected and after every
+        change, so edits from other windows show up without polling. A stream that
+        ends (e.g. "dropped" because this client fell behind) or fails is reopened
+        with backoff, and the "ready" event on reconnect catches up on what was missed.
+        """
+        delay = 1
+        while True:
+            try:
+                async with contextlib.aclosing(self.client.events(f"/{self.current_user}/events")) as stream:
+                    async for event, _ in stream:
+                        delay = 1
+                        if event in ("ready", "tasks"):
+                            # Not awaited, so the stream keeps being read; overlapping syncs are coalesced.
+                            self._sync_task = asyncio.ensure_future(self.load_tasks_from_api())
+                        elif event == "dropped":
+                            break
+            except ApiError as e:
+                if e.status in (401, 403, 404):
+                    # Refused even after logging in again, or a server without the feed: sync once and stop following.
+                    await self.load_tasks_from_api()
+                    return
+            except Exception:
+                # A malformed frame or a body cut off mid-stream: reopen it like any other broken stream.
+                logging.warning("Event feed failed, reconnecting in %s s", delay, exc_info=True)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, EVENT_RECONNECT_MAX_SECONDS)
 
     async def load_tasks_from_api(self):
-        tasks = await self.api_request("GET", f"/{self.current_user}")
-        if tasks is None:
+        """Reloads that overlap are coalesced: the newest one runs and the older ones wait for it"""
+        await self.client.latest("reload", self._load_changes)
+
+    async def _load_changes(self):
+        """Fetch only what changed since the last sync and merge it into the cache"""
+        params = {"since": self.sync_token} if self.sync_token is not None else {}
+        changes = await self.api_request("GET", f"/{self.current_user}/changes", params=params)
+        if changes is None:
             return
-        self.all_tasks = tasks
-        self.cached_tasks = {t["id"]: t for t in tasks}
-        self.root.after(0, lambda: self.update_tree(tasks))
-        self.root.after(0, self.filter_and_render_tasks)
-
-    def filter_and_render_tasks(self):
-        """Filter, sort, and render from in-memory cache"""
-        tasks = list(self.all_tasks)
-        query = self.search_var.get().lower()
-        filter_value = self.filter_var.get()
-
-        if query:
-            tasks = [
-                t for t in tasks
-                if query in (t["title"] or "").lower() or query in (t["tags"] or "").lower()
-            ]
-        if filter_value == "completed":
-            tasks = [t for t in tasks if t["completed"]]
-        elif filter_value == "not_completed":
-            tasks = [t for t in tasks if not t["completed"]]
-
-        if self.sort_column:
-            def get_value(task):
-                value = task.get(self.sort_column)
-                if self.sort_column == "due_date" and value:
-                    try:
-                        return datetime.fromisoformat(value)
-                    except ValueError:
-                        return datetime.max
-                if self.sort_column == "completed":
-                    return 1 if task["completed"] else 0
-                return value or ""
-            tasks.sort(key=get_value, reverse=self.sort_reverse)
-
-        self.tree.delete(*self.tree.get_children())
-        now = datetime.now()
-
-        for t in tasks:
-            due_date = t.get("due_date")
-            completed = t.get("completed")
-            row_id = self.tree.insert(
-                "", "end", iid=t["id"],
-                values=(
-                    t["title"],
-                    t.get("tags", ""),
-                    datetime.fromisoformat(due_date).strftime("%Y-%m-%d %H:%M") if due_date else "",
-                    "✅" if completed else "⚪"
-                ),
-            )
-            if not completed and due_date and datetime.fromisoformat(due_date) < now:
-                self.tree.item(row_id, tags=("overdue",))
-        self.tree.tag_configure("overdue", background="#ffcccc")
+        # full: our token is older than the server's change log or ahead of its version (database reset).
+        full_load = not params or changes.get("full", False)
+        # latest() cancels a superseded reload; once fetched, a delta is merged, persisted and
+        # its token advanced as one step, or a later delta would be stored on top of a gap.
+        await asyncio.shield(self._merge_changes(changes, full_load))
+
+    async def _merge_changes(self, changes, full_load):
+        async with self._merge_lock:
+            # The cache and the tree belong to the Tk thread, so the merge runs there.
+            await self.bridge.run_in_tk(self._apply_changes, changes, full_load)
+            if full_load:
+                self.disk_cache.replace(changes["tasks"], changes["token"])
+            else:
+                self.disk_cache.apply(changes["tasks"], changes["deleted"], changes["token"])
+
+    def _apply_changes(self, changes, full_load):
+        if full_load:
+            self.cached_tasks = {task_id: t for task_id, t in self.cached_tasks.items() if task_id in self._latest_write}
+        for task_id in changes["deleted"]:
+            if task_id in self._latest_write:
+                self._skipped_changes.add(task_id)
+                continue
+            self.cached_tasks.pop(task_id, None)
+            self.index.remove(task_id)
+        for t in changes["tasks"]:
+            if t["id"] in self._latest_write:
+                # A write of ours is still in flight. Its reply may predate this change and the token
+                # moves past it, so the task is fetched again once the write settles.
+                self._skipped_changes.add(t["id"])
+                continue
+            self.cached_tasks[t["id"]] = t
+            if not full_load:
+                self.index.upsert(t)
+        if full_load:
+            self.index.load(self.cached_tasks.values())
+        self.sync_token = changes["token"]
+        self.filter_and_render_tasks()
+
+    def schedule_search(self):
+        """Debounces the search box: renders once typing pauses for SEARCH_DEBOUNCE_MS"""
+        if self._search_after_id is not None:
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_after_id = None
+        self.filter_and_render_tasks(reset_window=True)
+
+    def filter_and_render_tasks(self, reset_window=False):
+        """Filter, sort, and render from the precomputed index, updating only rows that changed"""
+        ids = self.index.view(self.search_var.get(), self.filter_var.get(), self.sort_column, self.sort_reverse)
+        self.renderer.render(ids, self.index.rows, reset_window=reset_window)
 
     def sort_by_column(self, col):
         if self.sort_column == col:
@@ -147,7 +225,17 @@ class TaskManagerApp:
         else:
             self.sort_column = col
             self.sort_reverse = False
-        self.filter_and_render_tasks()
+        self.filter_and_render_tasks(reset_window=True)
+        self.save_prefs()
+
+    def change_filter(self):
+        self.filter_and_render_tasks(reset_window=True)
+        self.save_prefs()
+
+    def save_prefs(self):
+        prefs = {"sort_column": self.sort_column, "sort_reverse": self.sort_reverse, "filter": self.filter_var.get()}
+        # Disk writes stay off the Tk thread; the asyncio thread runs them in order.
+        self.bridge.loop.call_soon_threadsafe(self.disk_cache.save_prefs, prefs)
 
     def open_add_modal(self):
         self.open_task_modal("Add Task")
@@ -159,7 +247,7 @@ class TaskManagerApp:
             return
         task_id = selected[0]
         task = self.cached_tasks.get(int(task_id))
-        if task:
+        if task and not self._still_saving(task["id"]):
             self.open_task_modal("Edit Task", task)
 
     def delete_task(self):
@@ -167,32 +255,122 @@ class TaskManagerApp:
         if not selected:
             messagebox.showwarning("Select Task", "Please select a task to delete.")
             return
-        task_id = selected[0]
+        task_id = int(selected[0])
+        if self._still_saving(task_id):
+            return
         confirm = messagebox.askyesno("Confirm Delete", "Delete this task?")
         if confirm:
-            self.run_async(self._delete_task_async, task_id)
-
-    async def _delete_task_async(self, task_id):
-        await self.api_request("DELETE", f"/{self.current_user}/{task_id}")
-        await self.load_tasks_from_api()
+            self.write_optimistic(task_id, None, "DELETE", f"/{self.current_user}/{task_id}")
 
     def toggle_complete(self, event):
         selected = self.tree.selection()
         if not selected:
             return
-        task_id = selected[0]
-        self.run_async(self._toggle_complete_async, task_id)
+        task = self.cached_tasks[int(selected[0])]
+        if task["id"] < 0:
+            return
+        completed = not task["completed"]
+        self.write_optimistic(task["id"], {**task, "completed": completed}, "PUT", f"/{self.current_user}/{task['id']}",
+                              json={"completed": completed})
+
+    def save_task(self, task, data):
+        if task:
+            self.write_optimistic(task["id"], {**task, **data}, "PUT", f"/{self.current_user}/{task['id']}", json=data)
+            return
+        temp_id = self._next_temp_id
+        self._next_temp_id -= 1
+        local = {"id": temp_id, "completed": False, "created_by": self.current_user, "updated_by": self.current_user, **data}
+        self.write_optimistic(temp_id, local, "POST", f"/{self.current_user}", json=data)
+
+    def _still_saving(self, task_id):
+        if task_id < 0:
+            messagebox.showwarning("Please Wait", "This task is still being saved.")
+        return task_id < 0
+
+    def _put_local(self, task):
+        self.cached_tasks[task["id"]] = task
+        self.index.upsert(task)
+        self.filter_and_render_tasks()
 
-    async def _toggle_complete_async(self, task_id):
-        await self.api_request("PUT", f"/{self.current_user}/{task_id}", json={"completed": not self.cached_tasks[int(task_id)]["completed"]})
-        await self.load_tasks_from_api()
+    def _drop_local(self, task_id):
+        self.cached_tasks.pop(task_id, None)
+        self.index.remove(task_id)
+        self.filter_and_render_tasks()
 
-    async def _save_task_async(self, task_id, data, is_new):
-        if is_new:
-            await self.api_request("POST", f"/{self.current_user}", json=data)
+    def write_optimistic(self, task_id, local, method, endpoint, json=None):
+        """
+        Shows a write at once (local is the task as it will look, None for a delete)
+        and sends it in the background. The server's TaskResponse then replaces the
+        local copy, and a rejected write restores the previous one.
+        """
+        previous = self.cached_tasks.get(task_id)
+        self._write_seq += 1
+        self._latest_write[task_id] = self._write_seq
+        if local is None:
+            self._drop_local(task_id)
         else:
-            await self.api_request("PUT", f"/{self.current_user}/{task_id}", json=data)
-        await self.load_tasks_from_api()
+            self._put_local(local)
+        self.run_async(self._send_write, task_id, self._write_seq, previous, method, endpoint, json)
+
+    async def _send_write(self, task_id, seq, previous, method, endpoint, json):
+        try:
+            result, error = await self.client.request(method, endpoint, json=json), None
+        except ApiError as e:
+            result, error = None, e
+        await self.bridge.run_in_tk(self._settle_write, task_id, seq, previous, method, result, error)
+        if result is not None:
+            self.disk_cache.apply([result])
+        elif method == "DELETE" and (error is None or error.status == 404):
+            self.disk_cache.apply(deleted=[task_id])
+
+    def _settle_write(self, task_id, seq, previous, method, result, error):
+        # Only the newest write to a task may touch it, so a late reply cannot undo a later change.
+        latest = self._latest_write.get(task_id) == seq
+        if latest:
+            del self._latest_write[task_id]
+            if task_id in self._skipped_changes:
+                self._skipped_changes.discard(task_id)
+                self.run_async(self._refresh_task, task_id)
+        if error is None:
+            if result is not None and result["id"] != task_id:  # created: swap the temporary row for the real one
+                self._drop_local(task_id)
+                self._put_local(result)
+            elif result is not None and latest:
+                self._put_local(result)
+            return
+        if error.status == 404:  # already deleted on the server
+            self._drop_local(task_id)
+            if method != "DELETE":
+                messagebox.showerror("API Error", "The task no longer exists.")
+            return
+        if latest:
+            if previous is None:
+                self._drop_local(task_id)
+            else:
+                self._put_local(previous)
+        messagebox.showerror("API Error", f"The change could not be saved.\n{error}")
+
+    async def _refresh_task(self, task_id):
+        """Fetches one task that a sync skipped and stores the server's copy (or its deletion)"""
+        try:
+            task = await self.client.request("GET", f"/{self.current_user}/{task_id}")
+        except ApiError as e:
+            if e.status != 404:
+                logging.warning("Could not refresh task %s: %s", task_id, e)
+                return
+            task = None
+        if await self.bridge.run_in_tk(self._store_refreshed, task_id, task):
+            self.disk_cache.apply([task] if task else [], deleted=[] if task else [task_id])
+
+    def _store_refreshed(self, task_id, task):
+        if task_id in self._latest_write:
+            self._skipped_changes.add(task_id)  # written again meanwhile; refetched when that write settles
+            return False
+        if task is None:
+            self._drop_local(task_id)
+        else:
+            self._put_local(task)
+        return True
 
     def open_task_modal(self, title, task=None):
         modal = Toplevel(self.root)
@@ -242,11 +420,7 @@ class TaskManagerApp:
                 messagebox.showerror("Error", "Invalid time format. Use HH:MM.")
                 return
             data = {"title": title, "tags": tags, "due_date": due_datetime}
-            if task:
-                self.run_async(self._save_task_async, task['id'], data, False)
-
-            else:
-                self.run_async(self._save_task_async, None, data, True)
+            self.save_task(task, data)
             modal.destroy()
 
         ttk.Button(modal, text="💾 Save", command=save_task).pack(side="left", padx=20, pady=10)
@@ -285,91 +459,128 @@ class TaskManagerApp:
 
 AUTH_API_URL = "http://localhost:8000"
 class AuthApp:
-    def __init__(self, root):
+    def __init__(self, root, bridge, on_success, username=None):
+        """With username the session expired: that user logs in again, registering is not offered."""
         self.root = root
+        self.bridge = bridge
+        self.on_success = on_success
         self.auth_success = False  # will become True on successful login/register
         self.current_user = None
+        self.access_token = None
         self.modal = tk.Toplevel(self.root)
-        self.modal.title("Login")
+        self.modal.title("Session expired - log in again" if username else "Login")
         self.modal.geometry("300x200")
         self.modal.resizable(False, False)
         self.modal.grab_set() 
+        self.modal.protocol("WM_DELETE_WINDOW", self.root.destroy)
 
         ttk.Label(self.modal, text="Username:").pack(anchor="w", padx=10, pady=(10, 0))
         username_entry = ttk.Entry(self.modal, width=30)
         username_entry.pack(padx=10, pady=5)
+        if username:
+            username_entry.insert(0, username)
+            username_entry.state(["disabled"])
 
         ttk.Label(self.modal, text="Password:").pack(anchor="w", padx=10)
         password_entry = ttk.Entry(self.modal, width=30, show="*")
         password_entry.pack(padx=10, pady=5)
 
-        def login():
+        def credentials():
             username = username_entry.get().strip()
             password = password_entry.get().strip()
             if not username or not password:
                 messagebox.showerror("Error", "Username and password required.")
+                return None
+            return {"username": username, "password": password}
+
+        def on_authenticated(username, resp):
+            self.auth_success = True
+            self.current_user = username
+            self.access_token = resp.get("access_token")
+            self.modal.destroy()
+            self.on_success(self)
+
+        def login():
+            data = credentials()
+            if not data:
                 return
 
-            resp = self.api_request("POST", "/login", json={"username": username, "password": password})
-            status = resp.status_code
-            if status == 200:
-                self.auth_success = True
-                self.current_user = username
-                self.modal.destroy()
-            else:
-                messagebox.showerror("Login Failed", "Invalid credentials.")
+            def done(resp, error):
+                if error is None:
+                    on_authenticated(data["username"], resp)
+                elif error.status == 401:
+                    messagebox.showerror("Login Failed", "Invalid credentials.")
+                else:
+                    messagebox.showerror("Login Failed", str(error))
+
+            # Logging in has no side effects, so it is safe to retry (e.g. on 503 while hashing is overloaded).
+            self.api_request("POST", "/login", done, json=data, retry=True)
 
         def register():
-            username = username_entry.get().strip()
-            password = password_entry.get().strip()
-            if not username or not password:
-                messagebox.showerror("Error", "Username and password required.")
+            data = credentials()
+            if not data:
                 return
 
-            resp = self.api_request("POST", "/register", json={"username": username, "password": password})
-            status = resp.status_code
-            print(status)
-            if status == 201:
-                self.auth_success = True
-                self.current_user = username
-                self.modal.destroy()
-            else:
-                messagebox.showerror("Registration Failed", "Could not register user.")
+            def done(resp, error):
+                if error is None:
+                    on_authenticated(data["username"], resp)
+                else:
+                    messagebox.showerror("Registration Failed", f"Could not register user.\n{error}")
+
+            self.api_request("POST", "/register", done, json=data)
 
         button_frame = ttk.Frame(self.modal)
         button_frame.pack(pady=15) 
-        ttk.Button(button_frame, text="Login", command=login).grid(row=0, column=0, padx=5)
-        ttk.Button(button_frame, text="Register", command=register).grid(row=0, column=1, padx=5)
-        ttk.Button(button_frame, text="Cancel", command=self.modal.destroy).grid(row=0, column=2, padx=5)
+        self.buttons = [
+            ttk.Button(button_frame, text="Login", command=login),
+            *([] if username else [ttk.Button(button_frame, text="Register", command=register)]),
+            ttk.Button(button_frame, text="Cancel", command=self.root.destroy),
+        ]
+        for column, button in enumerate(self.buttons):
+            button.grid(row=0, column=column, padx=5)
+
+    def api_request(self, method, endpoint, on_done, **kwargs):
+        """
+        Sends the request on the asyncio thread so the Tk thread never blocks on the
+        network; on_done(response_json, ApiError | None) is called back on the Tk thread.
+        """
+        async def send():
+            client = ApiClient(AUTH_API_URL)
+            try:
+                resp, error = await client.request(method, endpoint, **kwargs), None
+            except ApiError as e:
+                resp, error = None, e
+            finally:
+                await client.close()
+            self.bridge.call_in_tk(finish, resp, error)
+
+        def finish(resp, error):
+            if not self.modal.winfo_exists():  # closed while the request was running
+                return
+            self.set_busy(False)
+            on_done(resp, error)
 
-    def api_request(self, method, endpoint="", **kwargs):
-        url = f"{AUTH_API_URL}{endpoint}"
-        try:
-            resp = requests.request(method, url, **kwargs)
-            resp.raise_for_status()
-            return resp
-        except requests.RequestException as e:
-            messagebox.showerror("API Error", str(e))
-            return None
-            
+        self.set_busy(True)
+        self.bridge.submit(send())
+
+    def set_busy(self, busy):
+        for button in self.buttons[:-1]:
+            button.state(["disabled"] if busy else ["!disabled"])
+        self.modal.config(cursor="watch" if busy else "")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     root = tk.Tk()
     root.withdraw() 
+    bridge = AsyncBridge(root)
 
-    auth = AuthApp(root)
-    root.wait_window(auth.modal) 
-
-    if auth.auth_success:
+    def start(auth):
         root.deiconify()  
-        app = TaskManagerApp(root, auth.current_user)
-
-        async def tkinter_loop():
-            while True:
-                root.update()
-                await asyncio.sleep(0.01)
+        TaskManagerApp(root, bridge, auth.current_user, auth.access_token)
 
-        asyncio.run(tkinter_loop())
-    else:
-        root.destroy()
\ No newline at end of file
+    AuthApp(root, bridge, on_success=start)
+    try:
+        root.mainloop()
+    finally:
+        bridge.stop()
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+"""
+On-disk snapshot of the GUI's task list, one SQLite file per server and user, so the
+window can render the last known list right after login and then ask the server only
+for what changed since the stored sync token.
+
+The file holds the tasks (as the server returned them), the sync token and the view
+preferences (sort column and direction, completion filter). It is only a cache: a
+file written by another SCHEMA_VERSION, or one that cannot be read, is discarded and
+rebuilt from the server. A snapshot over MAX_TASKS tasks or MAX_BYTES of JSON is not
+stored at all (only the preferences are), since a partial list with a sync token
+would hide the missing tasks. Only the MAX_USERS most recently used files are kept.
+"""
+SCHEMA_VERSION = 1
+CACHE_DIR = Path(os.getenv("GUI_CACHE_DIR", Path.home() / ".unimicro_task_manager" / "cache"))
+MAX_TASKS = int(os.getenv("GUI_CACHE_MAX_TASKS", "50000"))
+MAX_BYTES = int(os.getenv("GUI_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+MAX_USERS = int(os.getenv("GUI_CACHE_MAX_USERS", "20"))
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+"""
+
+class TaskCache:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.enabled = True
+        self._lock = threading.Lock()  # written from the asyncio thread, read on the Tk thread
+        self._conn = None
+
+    @classmethod
+    def for_user(cls, api_url: str, username: str, directory: Path = CACHE_DIR) -> "TaskCache":
+        name = hashlib.sha256(f"{api_url}\0{username}".encode("utf-8")).hexdigest()[:24]
+        return cls(Path(directory) / f"{name}.sqlite3")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript("DROP TABLE IF EXISTS meta; DROP TABLE IF EXISTS tasks;")
+                conn.executescript(SCHEMA)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _run(self, func, default=None):
+        """Runs func(conn) under the lock; a broken cache file is deleted and the cache turned off."""
+        if not self.enabled:
+            return default
+        with self._lock:
+            try:
+                with self._connect() as conn:  # one transaction
+                    return func(conn)
+            except (sqlite3.Error, OSError, ValueError) as e:
+                logger.warning("Disabling task cache %s: %s", self.path, e)
+                self.enabled = False
+                self._discard()
+                return default
+
+    def _discard(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+    def load(self) -> tuple[list[dict], str | None, dict]:
+        """Returns (tasks, sync token, preferences) from the last session; empty if there is none."""
+        def read(conn):
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            tasks = [json.loads(data) for (data,) in conn.execute("SELECT data FROM tasks")]
+            return tasks, meta.get("sync_token"), json.loads(meta.get("prefs", "{}"))
+
+        self.touch()
+        return self._run(read, default=([], None, {}))
+
+    def replace(self, tasks: list[dict], token: str | None):
+        """Stores a complete task list (a full load from the server)."""
+        rows = [(task["id"], json.dumps(task)) for task in tasks if task["id"] > 0]
+        if len(rows) > MAX_TASKS or sum(len(data) for _, data in rows) > MAX_BYTES:
+            rows, token = [], None
+
+        def write(conn):
+            conn.execute("DELETE FROM tasks")
+            conn.executemany("INSERT INTO tasks (id, data) VALUES (?, ?)", rows)
+            _set_token(conn, token)
+
+        self._run(write)
+
+    def apply(self, tasks: list[dict] = (), deleted: list[int] = (), token: str | None = None):
+        """Stores the differences from /changes or from a confirmed write; token None keeps the stored one."""
+        def write(conn):
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'sync_token'").fetchone() is None:
+                return  # no complete snapshot is stored (none yet, or over the limits), so there is nothing to patch
+            conn.executemany("INSERT OR REPLACE INTO tasks (id, data) VALUES (?, ?)",
+                             [(task["id"], json.dumps(task)) for task in tasks if task["id"] > 0])
+            conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in deleted])
+            if conn.execute("SELECT count(*) FROM tasks").fetchone()[0] > MAX_TASKS:
+                conn.execute("DELETE FROM tasks")
+                _set_token(conn, None)
+            elif token is not None:
+                _set_token(conn, token)
+
+        self._run(write)
+
+    def save_prefs(self, prefs: dict):
+        self._run(lambda conn: conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('prefs', ?)",
+                                            (json.dumps(prefs),)))
+
+    def touch(self):
+        """Marks this file as recently used and removes the least recently used ones beyond MAX_USERS."""
+        try:
+            if self.path.exists():
+                os.utime(self.path)
+            files = sorted(self.path.parent.glob("*.sqlite3"), key=lambda p: p.stat().st_mtime, reverse=True)
+        except OSError:
+            return
+        for stale in files[MAX_USERS:]:
+            if stale != self.path:
+                TaskCache(stale)._discard()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def _set_token(conn, token: str | None):
+    if token is None:
+        conn.execute("DELETE FROM meta WHERE key = 'sync_token'")
+    else:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sync_token', ?)", (token,))
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import random
+import aiohttp
+
+"""
+HTTP client for the GUI. One ApiClient holds one aiohttp.ClientSession for its whole
+life, so requests reuse pooled keep-alive connections instead of opening a session
+and a TCP connection per call.
+
+* At most max_concurrency requests are in flight; the rest wait on a semaphore.
+* Every request has a timeout. Idempotent methods (and requests made with
+  retry=True) are retried with exponential backoff on connection errors, timeouts
+  and 502/503/504, honouring Retry-After.
+* latest(key, ...) coalesces repeated work such as reloads: it cancels the run still
+  in flight under the same key and starts a new one, and every caller (including
+  those of the superseded run) gets the result of that single newest run. A reload
+  requested after a write therefore never reuses a fetch sent before it.
+* events(path) reads a Server-Sent Events stream. It does not count against
+  max_concurrency; the connection pool has one extra slot for it.
+* With reauthenticate (a coroutine function returning new headers, or None to give
+  up) a 401 renews the session and the request is sent again. Requests that fail
+  together share one renewal, so the user is asked to log in only once.
+"""
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+RETRY_STATUSES = {502, 503, 504}
+
+def _retry_after(value: str | None) -> float:
+    try:
+        return float(value or 0)
+    except ValueError:  # an HTTP date; the backoff delay is used instead
+        return 0.0
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+class ApiClient:
+    def __init__(self, base_url: str, headers: dict | None = None, max_concurrency: int = 4,
+                 timeout: float = 10.0, retries: int = 2, backoff: float = 0.25, reauthenticate=None):
+        self.base_url = base_url.rstrip("/")
+        self.headers = headers or {}
+        self.reauthenticate = reauthenticate
+        self._renewal = None
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=min(timeout, 5.0))
+        self.retries = retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._session = None
+        self._latest = {}  # key -> Task, for latest()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created on first use, inside the event loop the client will run on.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency + 1, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def request(self, method: str, path: str = "", *, retry: bool | None = None, **kwargs):
+        """Returns the decoded JSON body (None for other responses); raises ApiError when the request fails."""
+        session = self._get_session()
+        attempts = 1 + (self.retries if (retry if retry is not None else method.upper() in IDEMPOTENT_METHODS) else 0)
+        renewed = False
+        attempt = 0
+        while True:
+            last = attempt + 1 == attempts
+            delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+            headers = self.headers
+            try:
+                async with self._semaphore:
+                    async with session.request(method, self.base_url + path, headers=headers, **kwargs) as resp:
+                        if resp.status == 401 and self.reauthenticate is not None and not renewed:
+                            delay = None  # renewed below, outside the semaphore: it may wait for the user
+                        elif resp.status in RETRY_STATUSES and not last:
+                            delay = max(delay, _retry_after(resp.headers.get("Retry-After")))
+                        elif resp.status >= 400:
+                            raise ApiError(await self._error_message(resp), resp.status)
+                        elif resp.content_type == "application/json":
+                            return await resp.json()
+                        else:
+                            return None
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if last:
+                    raise ApiError(str(e) or type(e).__name__) from e
+            if delay is None:
+                renewed = True
+                if not await self.renew_session(headers):
+                    raise ApiError("401 Unauthorized: session expired", 401)
+                continue
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def renew_session(self, stale_headers: dict) -> bool:
+        """Replaces headers that got a 401 through reauthenticate; False if it gave up."""
+        if self.headers is not stale_headers:
+            return True  # already renewed by another request
+        if self._renewal is None or self._renewal.done():
+            self._renewal = asyncio.ensure_future(self.reauthenticate())
+        headers = await asyncio.shield(self._renewal)
+        if headers is None:
+            return False
+        if self.headers is stale_headers:
+            self.headers = headers
+        return True
+
+    @staticmethod
+    async def _error_message(resp) -> str:
+        try:
+            detail = (await resp.json()).get("detail")
+        except (aiohttp.ContentTypeError, ValueError, AttributeError):
+            detail = None
+        return f"{resp.status} {resp.reason}" + (f": {detail}" if detail else "")
+
+    async def events(self, path: str, read_timeout: float = 45.0):
+        """
+        Yields (event, data) from a Server-Sent Events stream until the server ends it.
+        Raises ApiError if the stream cannot be opened, breaks, or stays silent for
+        read_timeout seconds (the server sends a heartbeat well within that).
+        """
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.timeout.connect, sock_read=read_timeout)
+        headers = self.headers
+        try:
+            async with self._get_session().get(self.base_url + path, timeout=timeout,
+                                               headers={**headers, "Accept": "text/event-stream"}) as resp:
+                if resp.status == 401 and self.reauthenticate is not None:
+                    resp.release()
+                    if await self.renew_session(headers):
+                        raise ApiError("Session renewed, reconnect", None)
+                if resp.status >= 400:
+                    raise ApiError(await self._error_message(resp), resp.status)
+                event, data = "message", []
+                async for raw in resp.content:
+                    line = raw.decode("utf-8").rstrip("\r\n")
+                    if not line:
+                        if data:
+                            yield event, json.loads("\n".join(data))
+                        event, data = "message", []
+                    elif not line.startswith(":"):  # lines starting with ":" are comments (heartbeats)
+                        field, _, value = line.partition(":")
+                        value = value[1:] if value.startswith(" ") else value
+                        if field == "event":
+                            event = value
+                        elif field == "data":
+                            data.append(value)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ApiError(str(e) or type(e).__name__) from e
+
+    async def latest(self, key, coro_func, *args):
+        """Runs coro_func(*args), cancelling the previous run under key if it has not finished."""
+        previous = self._latest.get(key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        task = self._latest[key] = asyncio.ensure_future(coro_func(*args))
+        while True:
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                current = self._latest.get(key)
+                if not task.cancelled() or current is task:
+                    raise
+                task = current  # superseded: wait for the run that replaced it
+
+    async def close(self):
+        for task in self._latest.values():
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
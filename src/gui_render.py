@@ -0,0 +1,154 @@
+import bisect
+from datetime import datetime
+
+"""
+Render engine for the task list in gui.py.
+
+TaskIndex turns each task into a TaskRow once per load or change: the lowercased
+search text, the parsed due date and the display values are computed there, never
+per keystroke. It keeps one sorted list of ids per sort column, updated with bisect
+when a single task changes, so a view is a filtered walk over a list that is already
+in order. A query that extends the previous one only re-checks the previous matches.
+
+TreeRenderer applies a view to a ttk.Treeview as a diff: new rows are inserted,
+changed rows are updated in place, deleted tasks are removed and the order is set
+with one set_children call. Only the first `limit` rows of a view are attached;
+grow() attaches the next chunk when the list is scrolled near the bottom.
+"""
+SORT_COLUMNS = ("title", "tags", "due_date", "completed")
+RENDER_CHUNK = 500
+
+def parse_due(value) -> datetime | None:
+    """Due dates as naive local time (aware values are converted), None when missing or invalid."""
+    if not value:
+        return None
+    try:
+        due = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return due.astimezone().replace(tzinfo=None) if due.tzinfo else due
+
+class TaskRow:
+    __slots__ = ("id", "task", "search_text", "due", "completed", "values", "sort_keys")
+
+    def __init__(self, task: dict):
+        self.id = task["id"]
+        self.task = task
+        title, tags = task.get("title") or "", task.get("tags") or ""
+        self.search_text = (title.lower(), tags.lower())
+        self.due = parse_due(task.get("due_date"))
+        self.completed = bool(task.get("completed"))
+        self.values = (title, tags, self.due.strftime("%Y-%m-%d %H:%M") if self.due else "", "✅" if self.completed else "⚪")
+        # Undated tasks sort after dated ones; the id keeps keys unique for bisect.
+        self.sort_keys = {
+            "title": (title, self.id),
+            "tags": (tags, self.id),
+            "due_date": (self.due is None, self.due or datetime.max, self.id),
+            "completed": (self.completed, self.id),
+        }
+
+    def matches(self, query: str, filter_value: str) -> bool:
+        if filter_value == "completed" and not self.completed:
+            return False
+        if filter_value == "not_completed" and self.completed:
+            return False
+        return not query or query in self.search_text[0] or query in self.search_text[1]
+
+    def tags(self, now: datetime) -> tuple:
+        return ("overdue",) if not self.completed and self.due and self.due < now else ()
+
+class TaskIndex:
+    def __init__(self):
+        self.rows = {}
+        self.sorted = {}  # column -> [sort key], built on first use
+        self._last_view = None
+
+    def load(self, tasks):
+        self.rows = {task["id"]: TaskRow(task) for task in tasks}
+        self.sorted = {}
+        self._last_view = None
+
+    def upsert(self, task: dict):
+        old = self.rows.get(task["id"])
+        row = self.rows[task["id"]] = TaskRow(task)
+        for column, keys in self.sorted.items():
+            if old is not None:
+                del keys[bisect.bisect_left(keys, old.sort_keys[column])]
+            bisect.insort(keys, row.sort_keys[column])
+        self._last_view = None
+
+    def remove(self, task_id: int):
+        old = self.rows.pop(task_id, None)
+        if old is None:
+            return
+        for column, keys in self.sorted.items():
+            del keys[bisect.bisect_left(keys, old.sort_keys[column])]
+        self._last_view = None
+
+    def _ordered_ids(self, column: str, reverse: bool):
+        keys = self.sorted.get(column)
+        if keys is None:
+            keys = self.sorted[column] = sorted(row.sort_keys[column] for row in self.rows.values())
+        return (key[-1] for key in (reversed(keys) if reverse else keys))
+
+    def view(self, query: str = "", filter_value: str = "all", sort_column: str = "due_date", reverse: bool = False) -> list[int]:
+        """Ids of the matching tasks in display order."""
+        query = query.lower()
+        last = self._last_view
+        if last and last[0] in query and last[1:3] == (filter_value, sort_column) and last[3] == reverse:
+            candidates = last[4]
+        else:
+            candidates = self._ordered_ids(sort_column, reverse)
+        rows = self.rows
+        ids = [task_id for task_id in candidates if rows[task_id].matches(query, filter_value)]
+        self._last_view = (query, filter_value, sort_column, reverse, ids)
+        return ids
+
+class TreeRenderer:
+    def __init__(self, tree, chunk: int = RENDER_CHUNK):
+        self.tree = tree
+        self.chunk = chunk
+        self.limit = chunk
+        self.rendered = {}  # iid -> (values, tags) as last written to the tree
+        self.attached = ()
+        self._ids = []
+        self._rows = {}
+
+    def render(self, ids: list[int], rows: dict, reset_window: bool = False):
+        if reset_window:
+            self.limit = self.chunk
+        self._ids, self._rows = ids, rows
+        now = datetime.now()
+        target = [str(task_id) for task_id in ids[:self.limit]]
+        gone = [iid for iid in self.rendered if int(iid) not in rows]
+        if gone:
+            self.tree.delete(*gone)
+            for iid in gone:
+                del self.rendered[iid]
+        for iid, task_id in zip(target, ids):
+            row = rows[task_id]
+            state = (row.values, row.tags(now))
+            previous = self.rendered.get(iid)
+            if previous is None:
+                self.tree.insert("", "end", iid=iid, values=state[0], tags=state[1])
+            elif previous != state:
+                self.tree.item(iid, values=state[0], tags=state[1])
+            self.rendered[iid] = state
+        if tuple(target) != self.attached:
+            # Rows left out are detached, not deleted, so they come back cheaply.
+            self.tree.set_children("", *target)
+            self.attached = tuple(target)
+        if len(self.rendered) > len(target) + 2 * self.chunk:
+            keep = set(target)
+            stale = [iid for iid in self.rendered if iid not in keep]
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self.rendered[iid]
+
+    def grow(self) -> bool:
+        """Attaches the next chunk of the current view; False when everything is shown."""
+        if self.limit >= len(self._ids):
+            return False
+        self.limit += self.chunk
+        self.render(self._ids, self._rows)
+        return True
@@ -1,14 +1,56 @@
+import asyncio
+import datetime
+import logging
+import os
+import threading
 from fastapi import FastAPI
-from db import api
+from fastapi.concurrency import run_in_threadpool
+from db import api, authentication, crud, database, events, metrics
 from db.database import init_db, close_db
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
+logger = logging.getLogger(__name__)
+
+# Seconds between task_stats reconcile runs (which also prune the change log); 0 disables the job.
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+# Days of change log kept for /changes; clients with an older sync token get a full list.
+CHANGE_LOG_RETENTION_DAYS = float(os.getenv("CHANGE_LOG_RETENTION_DAYS", "30"))
+
+def reconcile_stats():
+    with database.SessionLocal() as db:
+        fixed = crud.reconcile_stats(db)
+        pruned = crud.prune_changes(db, datetime.timedelta(days=CHANGE_LOG_RETENTION_DAYS))
+    if fixed:
+        logger.warning("task_stats drifted for %d user(s), corrected: %s", len(fixed), ", ".join(fixed[:20]))
+    if pruned:
+        logger.info("Pruned %d change-log row(s) older than %g days", pruned, CHANGE_LOG_RETENTION_DAYS)
+
+async def reconcile_stats_periodically():
+    while True:
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL)
+        try:
+            await run_in_threadpool(reconcile_stats)
+        except Exception:
+            logger.exception("task_stats reconcile / change-log pruning failed")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    reconciler = asyncio.create_task(reconcile_stats_periodically()) if STATS_RECONCILE_INTERVAL > 0 else None
+    stop_listening, listener = threading.Event(), None
+    if events.PG_NOTIFY and database.engine.dialect.name == "postgresql":
+        listener = threading.Thread(target=events.listen, args=(database.engine, stop_listening),
+                                    name="task-events", daemon=True)
+        listener.start()
     yield
-    close_db()
+    if reconciler is not None:
+        reconciler.cancel()
+    if listener is not None:
+        stop_listening.set()
+        listener.join(timeout=5)
+    await close_db()
+    authentication.shutdown()
 
 app = FastAPI(title="Unimicro TODO API", lifespan=lifespan)
 
@@ -20,4 +62,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.instrument(database.engine)
+if database.async_engine is not None:
+    metrics.instrument(database.async_engine.sync_engine)
+
 app.include_router(api.router)
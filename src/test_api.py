@@ -1,6 +1,14 @@
 from fastapi.testclient import TestClient
 from main import app
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
+import concurrent.futures
+import json
+import uuid
+from fastapi.encoders import jsonable_encoder
+import logging
+from sqlalchemy import create_engine, select, text
+from db import api, cache, crud, database, diagnostics, events, schemas, tables
 
 client = TestClient(app)
 
@@ -65,8 +73,509 @@ def test_delete_task():
     assert verify_response.status_code == 404
     print("Deleted task ID:", task_id)
 
+def test_other_users_task_is_not_found():
+    """PUT/DELETE are scoped to the owner and answer 404 for anyone else"""
+    task = client.post("/tasks/owner", json={"title": "Private"}).json()
+    assert client.put(f"/tasks/intruder/{task['id']}", json={"title": "Mine now"}).status_code == 404
+    assert client.delete(f"/tasks/intruder/{task['id']}").status_code == 404
+    assert client.get(f"/tasks/owner/{task['id']}").json()["title"] == "Private"
+    assert client.delete(f"/tasks/owner/{task['id']}").status_code == 204
+
+
+def test_list_tasks_paginated():
+    """Test GET /tasks/{username}?limit=&cursor= walks every task exactly once"""
+    created = [
+        client.post("/tasks/pageuser", json={"title": f"Page Task {i}"}).json()["id"]
+        for i in range(5)
+    ]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/tasks/pageuser", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        seen.extend(t["id"] for t in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(created)
+
+    assert client.get("/tasks/pageuser", params={"cursor": "not-a-cursor"}).status_code == 400
+
+    streamed = client.get("/tasks/pageuser", params={"stream": True})
+    assert streamed.status_code == 200
+    assert sorted(t["id"] for t in streamed.json()) == sorted(created)
+    assert client.get("/tasks/pageuser", params={"stream": True, "limit": 1}).status_code == 400
+    assert client.get("/tasks/pageuser", params={"stream": True, "cursor": cursor or "x"}).status_code == 400
+
+    for task_id in created:
+        client.delete(f"/tasks/pageuser/{task_id}")
+    assert client.get("/tasks/pageuser", params={"stream": True}).json() == []
+    print("Paged task IDs:", seen)
+
+def test_search_modes():
+    """Test GET /tasks/{username}?query=&mode=prefix|substring|fulltext"""
+    report = client.post("/tasks/searchuser", json={"title": "Write quarterly report", "tags": "work,finance"}).json()
+    groceries = client.post("/tasks/searchuser", json={"title": "Buy groceries", "tags": "home,report"}).json()
+
+    def search(query, mode):
+        response = client.get("/tasks/searchuser", params={"query": query, "mode": mode})
+        assert response.status_code == 200
+        return [t["id"] for t in response.json()]
+
+    assert search("quart", "prefix") == [report["id"]]
+    assert search("uarter", "prefix") == []
+    assert search("uarter", "substring") == [report["id"]]
+    assert search("finance", "fulltext") == [report["id"]]
+    assert set(search("report", "fulltext")) == {report["id"], groceries["id"]}
+    # Title matches rank above tag-only matches
+    assert search("report", "substring") == [report["id"], groceries["id"]]
+    assert search("100%", "substring") == []
+    assert client.get("/tasks/searchuser", params={"query": "x", "mode": "regex"}).status_code == 422
+
+    client.delete(f"/tasks/searchuser/{report['id']}")
+    client.delete(f"/tasks/searchuser/{groceries['id']}")
+    assert search("report", "fulltext") == []
+
+def test_tag_filters_and_counts():
+    """Test exact tag filters and GET /tasks/{username}/tags"""
+    unit = client.post("/tasks/taguser", json={"title": "Unit", "tags": "test, Backend"}).json()
+    other = client.post("/tasks/taguser", json={"title": "Other", "tags": "unittest,backend"}).json()
+
+    def ids(**params):
+        response = client.get("/tasks/taguser", params=params)
+        assert response.status_code == 200
+        return sorted(t["id"] for t in response.json())
+
+    assert ids(tag="test") == [unit["id"]]
+    assert ids(tags_all="backend,test") == [unit["id"]]
+    assert ids(tags_any="test,unittest") == sorted([unit["id"], other["id"]])
+    assert ids(tags_all="test,unittest") == []
+
+    response = client.get("/tasks/taguser/tags")
+    assert response.status_code == 200
+    assert response.json() == [
+        {"tag": "backend", "count": 2},
+        {"tag": "test", "count": 1},
+        {"tag": "unittest", "count": 1},
+    ]
+
+    client.put(f"/tasks/taguser/{other['id']}", json={"tags": "test"})
+    assert ids(tag="test") == sorted([unit["id"], other["id"]])
+
+    client.delete(f"/tasks/taguser/{unit['id']}")
+    client.delete(f"/tasks/taguser/{other['id']}")
+    assert client.get("/tasks/taguser/tags").json() == []
+
+def test_batch_operations():
+    """Test POST /tasks/{username}/batch"""
+    existing = client.post("/tasks/batchuser", json={"title": "Existing", "tags": "old"}).json()
+    doomed = client.post("/tasks/batchuser", json={"title": "Doomed"}).json()
+
+    response = client.post("/tasks/batchuser/batch", json={"operations": [
+        {"op": "create", "task": {"title": "Batch 1", "tags": "bulk"}},
+        {"op": "update", "id": existing["id"], "task": {"completed": True, "tags": "bulk"}},
+        {"op": "create", "task": {"title": "Batch 2"}},
+        {"op": "delete", "id": doomed["id"]},
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["committed"] is True
+    assert [r["status"] for r in data["results"]] == [201, 200, 201, 204]
+    assert data["results"][0]["task"]["title"] == "Batch 1"
+    assert data["results"][1]["task"]["completed"] is True
+    assert data["results"][1]["task"]["title"] == "Existing"
+    assert client.get(f"/tasks/batchuser/{doomed['id']}").status_code == 404
+    assert client.get("/tasks/batchuser/tags").json() == [{"tag": "bulk", "count": 2}]
+
+    # all_or_nothing: one missing task rolls back the whole batch
+    response = client.post("/tasks/batchuser/batch", json={"operations": [
+        {"op": "create", "task": {"title": "Never stored"}},
+        {"op": "delete", "id": doomed["id"]},
+    ]})
+    assert response.status_code == 409
+    assert [r["status"] for r in response.json()["results"]] == [424, 404]
+    assert "Never stored" not in [t["title"] for t in client.get("/tasks/batchuser").json()]
+
+    # best_effort: the failed item is reported, the rest is committed
+    response = client.post("/tasks/batchuser/batch", json={"mode": "best_effort", "operations": [
+        {"op": "delete", "id": doomed["id"]},
+        {"op": "update", "id": existing["id"], "task": {"title": "Renamed"}},
+    ]})
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["results"]] == [404, 200]
+
+    response = client.post("/tasks/batchuser/batch", json={"operations": [
+        {"op": "update", "id": existing["id"], "task": {"title": "A"}},
+        {"op": "delete", "id": existing["id"]},
+    ]})
+    assert response.status_code == 422
+
+    ids = [t["id"] for t in client.get("/tasks/batchuser").json()]
+    response = client.post("/tasks/batchuser/batch", json={"operations": [{"op": "delete", "id": i} for i in ids]})
+    assert response.json()["committed"] is True
+    assert client.get("/tasks/batchuser").json() == []
+
+def test_changes_since_token():
+    """Test GET /tasks/{username}/changes?since= returns only the delta"""
+    first = client.get("/tasks/syncuser/changes")
+    assert first.status_code == 200
+    assert first.json()["deleted"] == [] and first.json()["full"] is True
+    token = first.json()["token"]
+
+    kept = client.post("/tasks/syncuser", json={"title": "Kept"}).json()
+    gone = client.post("/tasks/syncuser", json={"title": "Gone"}).json()
+    delta = client.get("/tasks/syncuser/changes", params={"since": token}).json()
+    assert sorted(t["id"] for t in delta["tasks"]) == sorted([kept["id"], gone["id"]])
+    token = delta["token"]
+
+    assert client.get("/tasks/syncuser/changes", params={"since": token}).json() == {
+        "tasks": [], "deleted": [], "token": token, "full": False}
+
+    client.put(f"/tasks/syncuser/{kept['id']}", json={"completed": True})
+    client.delete(f"/tasks/syncuser/{gone['id']}")
+    delta = client.get("/tasks/syncuser/changes", params={"since": token}).json()
+    assert [(t["id"], t["completed"]) for t in delta["tasks"]] == [(kept["id"], True)]
+    assert delta["deleted"] == [gone["id"]]
+    assert int(delta["token"]) > int(token)
+
+    assert client.get("/tasks/syncuser/changes", params={"since": "abc"}).status_code == 400
+    client.delete(f"/tasks/syncuser/{kept['id']}")
+
+def test_change_log_retention():
+    """Test that pruning the change log sends older sync tokens a full list"""
+    kept = client.post("/tasks/pruneuser", json={"title": "Kept"}).json()
+    old_token = client.get("/tasks/pruneuser/changes").json()["token"]
+    gone = client.post("/tasks/pruneuser", json={"title": "Gone"}).json()
+    client.delete(f"/tasks/pruneuser/{gone['id']}")
+    token = client.get("/tasks/pruneuser/changes").json()["token"]
+
+    with database.SessionLocal() as db:
+        def logged():
+            return len(db.scalars(select(tables.TaskChange).where(tables.TaskChange.created_by == "pruneuser")).all())
+        crud.prune_changes(db, timedelta(days=30))
+        assert logged() == 3
+        crud.prune_changes(db, timedelta(0))
+        assert logged() == 0
+
+    stale = client.get("/tasks/pruneuser/changes", params={"since": old_token}).json()
+    assert stale["full"] is True and [t["id"] for t in stale["tasks"]] == [kept["id"]]
+    assert client.get("/tasks/pruneuser/changes", params={"since": token}).json() == {
+        "tasks": [], "deleted": [], "token": token, "full": False}
+    ahead = client.get("/tasks/pruneuser/changes", params={"since": int(token) + 10}).json()
+    assert ahead["full"] is True and ahead["token"] == token
+    client.delete(f"/tasks/pruneuser/{kept['id']}")
+
+def test_conditional_requests():
+    """Test ETag / If-None-Match (304) and If-Match (412)"""
+    task = client.post("/tasks/etaguser", json={"title": "Cached"}).json()
+    listing = client.get("/tasks/etaguser")
+    etag = listing.headers["ETag"]
+    assert "Last-Modified" in listing.headers
+
+    not_modified = client.get("/tasks/etaguser", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert client.get(f"/tasks/etaguser/{task['id']}", headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.put(f"/tasks/etaguser/{task['id']}", json={"title": "v2"}, headers={"If-Match": etag}).status_code == 200
+    assert client.get("/tasks/etaguser", headers={"If-None-Match": etag}).status_code == 200
+
+    # A write based on the stale ETag is rejected and leaves the task unchanged
+    assert client.put(f"/tasks/etaguser/{task['id']}", json={"title": "lost"}, headers={"If-Match": etag}).status_code == 412
+    assert client.delete(f"/tasks/etaguser/{task['id']}", headers={"If-Match": etag}).status_code == 412
+    assert client.get(f"/tasks/etaguser/{task['id']}").json()["title"] == "v2"
+
+    current = client.get(f"/tasks/etaguser/{task['id']}").headers["ETag"]
+    assert client.delete(f"/tasks/etaguser/{task['id']}", headers={"If-Match": current}).status_code == 204
+
+def test_read_cache():
+    """Test that repeated reads hit the cache and writes invalidate it"""
+    task = client.post("/tasks/cacheuser", json={"title": "Before"}).json()
+    client.get(f"/tasks/cacheuser/{task['id']}")
+    before = client.get("/cache/stats").json()
+    assert client.get(f"/tasks/cacheuser/{task['id']}").json()["title"] == "Before"
+    assert client.get("/cache/stats").json()["hits"] > before["hits"]
+
+    client.get("/tasks/cacheuser")
+    client.put(f"/tasks/cacheuser/{task['id']}", json={"title": "After"})
+    assert client.get(f"/tasks/cacheuser/{task['id']}").json()["title"] == "After"
+    assert [t["title"] for t in client.get("/tasks/cacheuser").json()] == ["After"]
+    assert client.get("/cache/stats").json()["invalidations"] > before["invalidations"]
+    client.delete(f"/tasks/cacheuser/{task['id']}")
+    assert client.get(f"/tasks/cacheuser/{task['id']}").status_code == 404
+
+def test_cache_backend():
+    """Test that backends must implement the whole interface and that generations stay bounded"""
+    class Incomplete(cache.CacheBackend):
+        def get(self, key):
+            return cache.MISS
+    try:
+        Incomplete()
+        assert False, "an incomplete backend was constructed"
+    except TypeError:
+        pass
+
+    lru = cache.LRUCache(maxsize=2)
+    generation = lru.generation("a")
+    for user in ("a", "b", "c", "d"):
+        lru.invalidate(user)
+    assert len(lru._generations) == 2
+    lru.set(("a", "tasks"), [], generation)  # "a" was invalidated after the read, even though it was dropped
+    assert lru.get(("a", "tasks")) is cache.MISS
+    lru.set(("a", "tasks"), [], lru.generation("a"))
+    assert lru.get(("a", "tasks")) == []
+
+def test_session_tokens():
+    """Test that /login issues a bearer token the task endpoints accept for that user only"""
+    username = f"tokenuser-{uuid.uuid4().hex[:8]}"
+    registered = client.post("/register", json={"username": username, "password": "secret"})
+    assert registered.status_code == 201
+    assert registered.json()["access_token"]
+
+    assert client.post("/login", json={"username": username, "password": "wrong"}).status_code == 401
+    login = client.post("/login", json={"username": username, "password": "secret"})
+    assert login.status_code == 200
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    assert client.get(f"/tasks/{username}", headers=headers).status_code == 200
+    assert client.get("/tasks/someone-else", headers=headers).status_code == 403
+    assert client.get(f"/tasks/{username}", headers={"Authorization": "Bearer forged.token"}).status_code == 401
+
+def test_metrics():
+    """Test that /metrics reports per-route requests, latency and SQL statements"""
+    client.get("/tasks/metricsuser")
+    body = client.get("/metrics").text
+    assert 'http_requests_total{method="GET",route="/tasks/{username}",status="200"}' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/tasks/{username}"}' in body
+    assert 'http_request_db_queries_bucket{method="GET",route="/tasks/{username}",le="+Inf"}' in body
+    assert "db_queries_total" in body
+    assert 'http_requests_in_flight{method="GET",route="/metrics"} 1' in body
+
+def test_slow_write_is_not_run_twice_by_diagnostics():
+    """Test that capturing the plan of a slow CTE write does not execute the write again"""
+    pg_write = ("WITH bump AS (INSERT INTO versions (n) VALUES (1) RETURNING n) "
+                "INSERT INTO changes (n) SELECT n FROM bump")
+    assert diagnostics.explain_prefix("postgresql", pg_write) == "EXPLAIN "
+    assert diagnostics.explain_prefix("postgresql", "SELECT 1").startswith("EXPLAIN (ANALYZE")
+
+    engine = create_engine("sqlite://")
+    diagnostics.enable(engine)
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    diagnostics.logger.addHandler(handler)
+    threshold, diagnostics.SLOW_QUERY_MS = diagnostics.SLOW_QUERY_MS, 0
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE changes (n INTEGER)"))
+            records.clear()
+            conn.execute(text("WITH bump AS (SELECT 1 AS n) INSERT INTO changes (n) SELECT n FROM bump"))
+            assert conn.execute(text("SELECT count(*) FROM changes")).scalar() == 1
+    finally:
+        diagnostics.SLOW_QUERY_MS = threshold
+        diagnostics.logger.removeHandler(handler)
+    assert "Slow query" in records[0].getMessage() and "EXPLAIN failed" not in records[0].getMessage()
+
+def test_list_serialization_matches_response_model():
+    """Test that the orjson list path produces the same bytes as FastAPI's response_model path"""
+    client.post("/tasks/jsonuser", json={"title": "Æble – ✓ \"quoted\"", "tags": "x,y", "due_date": "2030-05-06T07:08:09.123456"})
+    client.post("/tasks/jsonuser", json={"title": "Plain", "due_date": "2030-05-06T07:08:09"})
+    for params in ({}, {"limit": 1}, {"stream": True}):
+        response = client.get("/tasks/jsonuser", params=params)
+        models = [schemas.TaskResponse.model_validate(t) for t in response.json()]
+        expected = json.dumps(jsonable_encoder(models), ensure_ascii=False, allow_nan=False,
+                              indent=None, separators=(",", ":")).encode("utf-8")
+        assert response.content == expected
+        assert response.headers["content-type"] == "application/json"
+        assert "ETag" in response.headers
+    for task in client.get("/tasks/jsonuser").json():
+        client.delete(f"/tasks/jsonuser/{task['id']}")
+
+def test_export_import():
+    """Test that an NDJSON/CSV export imports into another user, with per-row errors reported"""
+    client.post("/tasks/exportuser", json={"title": "Første, \"quoted\"", "tags": "a,b", "due_date": "2030-01-02T03:04:05"})
+    client.post("/tasks/exportuser", json={"title": "Done", "completed": True})
+    source = sorted(client.get("/tasks/exportuser").json(), key=lambda t: t["title"])
+    fields = ("title", "tags", "due_date", "completed", "created_at", "updated_at")
+
+    for fmt in ("ndjson", "csv"):
+        exported = client.get("/tasks/exportuser/export", params={"format": fmt})
+        assert exported.status_code == 200
+        target = f"importuser-{fmt}"
+        body = exported.content + (b'{"title": ""}\nnot json\n' if fmt == "ndjson" else b",,,,,,,,\n")
+        result = client.post(f"/tasks/{target}/import", params={"format": fmt}, content=body).json()
+        assert result["imported"] == 2
+        assert result["failed"] == (2 if fmt == "ndjson" else 1)
+        assert result["errors"][0]["line"] == (3 if fmt == "ndjson" else 4)
+        imported = sorted(client.get(f"/tasks/{target}").json(), key=lambda t: t["title"])
+        assert [{f: t[f] for f in fields} for t in imported] == [{f: t[f] for f in fields} for t in source]
+        assert sorted(t["tag"] for t in client.get(f"/tasks/{target}/tags").json()) == ["a", "b"]
+        for task in imported:
+            client.delete(f"/tasks/{target}/{task['id']}")
+    for task in source:
+        client.delete(f"/tasks/exportuser/{task['id']}")
+
+def test_import_invalid_utf8():
+    """Test that a body that isn't UTF-8 gives per-row errors and keeps the rows before it"""
+    ndjson = b'{"title": "Before"}\n{"title": "Bad \xff\xfe"}\n{"title": "After"}\n'
+    result = client.post("/tasks/utf8user/import", params={"format": "ndjson"}, content=ndjson)
+    assert result.status_code == 200
+    assert result.json()["imported"] == 2 and result.json()["errors"][0]["line"] == 2
+
+    csv_body = b"title,tags\nCsv before,a\n" + "Latin-1 æøå,b\n".encode("latin-1") + b"Csv after,c\n"
+    result = client.post("/tasks/utf8user/import", params={"format": "csv"}, content=csv_body)
+    assert result.status_code == 200
+    assert result.json()["imported"] == 1 and result.json()["failed"] == 1
+    assert result.json()["errors"][0]["line"] == 3 and "UTF-8" in result.json()["errors"][0]["error"]
+    assert sorted(t["title"] for t in client.get("/tasks/utf8user").json()) == ["After", "Before", "Csv before"]
+    for task in client.get("/tasks/utf8user").json():
+        client.delete(f"/tasks/utf8user/{task['id']}")
+
+def test_task_stats():
+    """Test that /stats follows creates, updates, batches and deletes"""
+    def stats():
+        return client.get("/tasks/statsuser/stats").json()
+
+    assert stats() == {"total": 0, "completed": 0, "open": 0, "overdue": 0}
+    late = client.post("/tasks/statsuser", json={"title": "Late", "due_date": "2000-01-01T00:00:00"}).json()
+    done = client.post("/tasks/statsuser", json={"title": "Done", "completed": True}).json()
+    assert stats() == {"total": 2, "completed": 1, "open": 1, "overdue": 1}
+
+    client.put(f"/tasks/statsuser/{late['id']}", json={"completed": True})
+    client.put(f"/tasks/statsuser/{late['id']}", json={"completed": True})
+    assert stats() == {"total": 2, "completed": 2, "open": 0, "overdue": 0}
+
+    client.post("/tasks/statsuser/batch", json={"operations": [
+        {"op": "create", "task": {"title": "New"}},
+        {"op": "update", "id": done["id"], "task": {"completed": False}},
+        {"op": "delete", "id": late["id"]},
+    ]})
+    assert stats() == {"total": 2, "completed": 0, "open": 2, "overdue": 0}
+
+    for task in client.get("/tasks/statsuser").json():
+        client.delete(f"/tasks/statsuser/{task['id']}")
+    assert stats() == {"total": 0, "completed": 0, "open": 0, "overdue": 0}
+
+def test_task_stats_under_concurrent_updates():
+    """Test that concurrent completed toggles of one task keep /stats consistent"""
+    task = client.post("/tasks/raceuser", json={"title": "Contended"}).json()
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        statuses = list(pool.map(
+            lambda i: client.put(f"/tasks/raceuser/{task['id']}", json={"completed": i % 3 != 0}).status_code,
+            range(24)))
+    assert set(statuses) == {200}
+    stats = client.get("/tasks/raceuser/stats").json()
+    completed = client.get(f"/tasks/raceuser/{task['id']}").json()["completed"]
+    assert stats["total"] == 1 and stats["completed"] == int(completed)
+    assert stats["completed"] + stats["open"] == stats["total"]
+    client.delete(f"/tasks/raceuser/{task['id']}")
+
+def test_due_date_queries():
+    """Test due-date windows, overdue, sort=due_date pages and /upcoming"""
+    user = f"dueuser-{uuid.uuid4().hex[:8]}"
+    now = datetime.now()
+    def due(days):
+        return (now + timedelta(days=days)).isoformat()
+    late = client.post(f"/tasks/{user}", json={"title": "Late", "due_date": due(-2)}).json()
+    client.post(f"/tasks/{user}", json={"title": "Late but done", "due_date": due(-1), "completed": True})
+    soon = client.post(f"/tasks/{user}", json={"title": "Soon", "due_date": due(1)}).json()
+    later = client.post(f"/tasks/{user}", json={"title": "Later", "due_date": due(3)}).json()
+    far = client.post(f"/tasks/{user}", json={"title": "Far", "due_date": due(30)}).json()
+    undated = client.post(f"/tasks/{user}", json={"title": "Undated"}).json()
+
+    def titles(**params):
+        return [t["title"] for t in client.get(f"/tasks/{user}", params=params).json()]
+
+    assert titles(overdue=True) == ["Late"]
+    assert titles(due_after=due(0), due_before=due(5), sort="due_date") == ["Soon", "Later"]
+    assert titles(sort="due_date") == ["Late", "Late but done", "Soon", "Later", "Far", "Undated"]
+
+    pages, cursor = [], None
+    while True:
+        params = {"sort": "due_date", "completed": False, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"/tasks/{user}", params=params)
+        pages.append([t["id"] for t in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert pages == [[late["id"], soon["id"]], [later["id"], far["id"]], [undated["id"]]]
+    # A cursor only resumes the order it was issued for.
+    response = client.get(f"/tasks/{user}", params={"limit": 2, "cursor": client.get(
+        f"/tasks/{user}", params={"sort": "due_date", "limit": 2}).headers["X-Next-Cursor"]})
+    assert response.status_code == 400
+
+    response = client.get(f"/tasks/{user}/upcoming", params={"within": "7d", "limit": 1})
+    assert [t["id"] for t in response.json()] == [soon["id"]]
+    response = client.get(f"/tasks/{user}/upcoming", params={"within": "7d", "cursor": response.headers["X-Next-Cursor"]})
+    assert [t["id"] for t in response.json()] == [later["id"]]
+    assert "X-Next-Cursor" not in response.headers
+    assert [t["id"] for t in client.get(f"/tasks/{user}/upcoming", params={"within": "5w"}).json()] == [soon["id"], later["id"], far["id"]]
+    assert client.get(f"/tasks/{user}/upcoming", params={"within": "soon"}).status_code == 422
+
+def test_event_feed():
+    """Test that committed writes reach event subscribers and that slow subscribers are dropped"""
+    async def run():
+        subscription = events.broker.subscribe("eventuser")
+        try:
+            task = client.post("/tasks/eventuser", json={"title": "Ping"}).json()
+            client.put(f"/tasks/eventuser/{task['id']}", json={"completed": True})
+            client.delete(f"/tasks/eventuser/{task['id']}")
+            received = [await asyncio.wait_for(subscription.queue.get(), 5) for _ in range(3)]
+        finally:
+            events.broker.unsubscribe(subscription)
+        assert [(e["created"], e["updated"], e["deleted"]) for e in received] == [
+            ([task["id"]], [], []), ([], [task["id"]], []), ([], [], [task["id"]])]
+        assert received[0]["version"] < received[1]["version"] < received[2]["version"]
+
+        broker = events.Broker(queue_size=2)
+        slow = broker.subscribe("eventuser")
+        for version in range(3):
+            broker.deliver("eventuser", events.make_event(version))
+        await asyncio.sleep(0)
+        assert slow.dropped and slow.queue.get_nowait() is events.DROPPED
+        broker.unsubscribe(slow)
+        assert broker.stats() == {"subscribers": 0, "users": 0, "dropped": 1}
+
+        stream = events.broker.subscribe("streamuser")
+        events.broker.deliver("streamuser", events.make_event(7, updated=[1]))
+        await asyncio.sleep(0)
+        stream.queue.put_nowait(events.DROPPED)
+        body = b"".join([chunk async for chunk in api.event_stream(stream)])
+        assert b'id: 7\nevent: tasks\ndata: {"version":7,"created":[],"updated":[1],"deleted":[]}\n\n' in body
+        assert body.endswith(b"event: dropped\ndata: {}\n\n")
+        assert "streamuser" not in events.broker.subscribers
+
+    asyncio.run(run())
+
 if __name__ == "__main__":
     test_create_task()
     test_get_tasks()
     test_update_task()
     test_delete_task()
+    test_other_users_task_is_not_found()
+    test_list_tasks_paginated()
+    test_search_modes()
+    test_tag_filters_and_counts()
+    test_batch_operations()
+    test_changes_since_token()
+    test_change_log_retention()
+    test_conditional_requests()
+    test_read_cache()
+    test_cache_backend()
+    test_session_tokens()
+    test_metrics()
+    test_slow_write_is_not_run_twice_by_diagnostics()
+    test_list_serialization_matches_response_model()
+    test_export_import()
+    test_import_invalid_utf8()
+    test_task_stats()
+    test_task_stats_under_concurrent_updates()
+    test_due_date_queries()
+    test_event_feed()
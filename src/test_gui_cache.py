@@ -0,0 +1,51 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+import gui_cache
+from gui_cache import TaskCache
+
+def make_cache(directory):
+    return TaskCache.for_user("http://localhost:8000/tasks", "cacheuser", directory)
+
+def test_snapshot_round_trip():
+    """Test that tasks, the sync token and preferences survive a restart"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = make_cache(directory)
+        assert cache.load() == ([], None, {})
+        cache.replace([{"id": 1, "title": "a"}, {"id": 2, "title": "b"}, {"id": -1, "title": "unsaved"}], "5")
+        cache.apply([{"id": 2, "title": "b2"}, {"id": 3, "title": "c"}], deleted=[1], token="7")
+        cache.save_prefs({"sort_column": "title", "filter": "completed"})
+        cache.close()
+
+        tasks, token, prefs = make_cache(directory).load()
+        assert sorted(t["title"] for t in tasks) == ["b2", "c"]
+        assert token == "7"
+        assert prefs == {"sort_column": "title", "filter": "completed"}
+
+def test_limits_and_schema_version():
+    """Test that oversized snapshots and files from another schema version are not used"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = make_cache(directory)
+        limit, gui_cache.MAX_TASKS = gui_cache.MAX_TASKS, 2
+        try:
+            cache.replace([{"id": i} for i in range(1, 4)], "3")
+            assert cache.load()[:2] == ([], None)
+            cache.apply([{"id": 9}], token="4")  # nothing to patch without a complete snapshot
+            assert cache.load()[:2] == ([], None)
+        finally:
+            gui_cache.MAX_TASKS = limit
+        cache.replace([{"id": 1}], "1")
+        cache.close()
+
+        with sqlite3.connect(cache.path) as conn:
+            conn.execute(f"PRAGMA user_version = {gui_cache.SCHEMA_VERSION + 1}")
+        assert make_cache(directory).load() == ([], None, {})
+
+        Path(cache.path).write_bytes(b"not a database")
+        broken = make_cache(directory)
+        assert broken.load() == ([], None, {})
+        assert not broken.enabled and not Path(cache.path).exists()
+
+if __name__ == "__main__":
+    test_snapshot_round_trip()
+    test_limits_and_schema_version()
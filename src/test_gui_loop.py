@@ -0,0 +1,79 @@
+import concurrent.futures
+from gui_loop import AsyncBridge
+
+class FakeRoot:
+    """Stands in for tk.Tk: after() runs the callback at once, or raises after_error."""
+
+    def __init__(self, threaded=True):
+        self.tk = self
+        self.threaded = threaded
+        self.after_error = None
+        self.scheduled = []
+        self.reported = []
+
+    def call(self, *args):
+        return "1" if self.threaded else "0"
+
+    def after(self, ms, func):
+        if self.after_error is not None:
+            raise self.after_error
+        if self.threaded:
+            func()
+        else:
+            self.scheduled.append(func)
+
+    def report_callback_exception(self, exc_type, exc, tb):
+        self.reported.append(exc)
+
+def fail():
+    raise RuntimeError("callback bug")
+
+def test_callback_errors_do_not_close_the_bridge():
+    """Test that a failing callback reaches its awaiter and only a Tk shutdown closes the bridge"""
+    root = FakeRoot()
+    bridge = AsyncBridge(root)
+    try:
+        try:
+            bridge.submit(bridge.run_in_tk(fail)).result(2)
+            assert False, "the callback's error was not raised"
+        except RuntimeError as e:
+            assert str(e) == "callback bug"
+        assert not bridge.closed
+        assert bridge.submit(bridge.run_in_tk(lambda: 42)).result(2) == 42
+
+        root.after_error = RuntimeError("some other failure")
+        try:
+            bridge.submit(bridge.run_in_tk(lambda: 1)).result(2)
+            assert False, "the after() error was not raised"
+        except RuntimeError as e:
+            assert str(e) == "some other failure"
+        assert not bridge.closed
+
+        root.after_error = RuntimeError("main thread is not in main loop")
+        try:
+            bridge.submit(bridge.run_in_tk(lambda: 1)).result(2)
+            assert False, "run_in_tk returned after Tk shut down"
+        except concurrent.futures.CancelledError:
+            pass
+        assert bridge.closed
+    finally:
+        bridge.stop()
+
+def test_fallback_poll_survives_failing_callbacks():
+    """Test that without threaded Tcl a failing callback is reported and the queue keeps draining"""
+    root = FakeRoot(threaded=False)
+    bridge = AsyncBridge(root)
+    try:
+        ran = []
+        bridge.call_in_tk(fail)
+        bridge.call_in_tk(ran.append, 1)
+        root.scheduled.pop(0)()  # one poll
+        assert ran == [1]
+        assert [str(e) for e in root.reported] == ["callback bug"]
+        assert root.scheduled  # the next poll is scheduled
+    finally:
+        bridge.stop()
+
+if __name__ == "__main__":
+    test_callback_errors_do_not_close_the_bridge()
+    test_fallback_poll_survives_failing_callbacks()
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from gui_render import TaskIndex, TreeRenderer
+
+class FakeTree:
+    """Records the Treeview calls TreeRenderer makes."""
+
+    def __init__(self):
+        self.items = {}
+        self.children = []
+        self.calls = []
+
+    def insert(self, parent, index, iid, values, tags):
+        self.calls.append(("insert", iid))
+        self.items[iid] = (values, tags)
+        self.children.append(iid)
+
+    def item(self, iid, values, tags):
+        self.calls.append(("item", iid))
+        self.items[iid] = (values, tags)
+
+    def delete(self, *iids):
+        self.calls.append(("delete",) + iids)
+        for iid in iids:
+            del self.items[iid]
+            if iid in self.children:
+                self.children.remove(iid)
+
+    def set_children(self, parent, *iids):
+        self.calls.append(("set_children", len(iids)))
+        self.children = list(iids)
+
+def make_tasks():
+    now = datetime.now()
+    return [
+        {"id": 1, "title": "Write report", "tags": "work", "completed": False, "due_date": (now - timedelta(days=1)).isoformat()},
+        {"id": 2, "title": "Buy milk", "tags": "home", "completed": True, "due_date": (now + timedelta(days=1)).isoformat()},
+        {"id": 3, "title": "Review PR", "tags": "work,code", "completed": False, "due_date": None},
+        {"id": 4, "title": "Report taxes", "tags": "home", "completed": False, "due_date": (now + timedelta(days=2)).isoformat()},
+    ]
+
+def test_index_views():
+    """Test filtering, sorting and incremental updates of TaskIndex"""
+    index = TaskIndex()
+    index.load(make_tasks())
+    assert index.view() == [1, 2, 4, 3]
+    assert index.view(sort_column="due_date", reverse=True) == [3, 4, 2, 1]
+    assert index.view("rep") == [1, 4]
+    assert index.view("repo") == [1, 4]
+    assert index.view("re") == [1, 4, 3]
+    assert index.view("HOME", "not_completed") == [4]
+    assert index.view(sort_column="title") == [2, 4, 3, 1]
+
+    index.upsert({"id": 2, "title": "Buy oat milk", "tags": "home", "completed": False, "due_date": None})
+    index.remove(1)
+    assert index.view("") == [4, 2, 3]
+    assert index.view(sort_column="title") == [2, 4, 3]
+    assert index.view(sort_column="completed") == [2, 3, 4]
+
+def test_renderer_applies_diffs():
+    """Test that TreeRenderer only touches rows that changed"""
+    index, tree = TaskIndex(), FakeTree()
+    renderer = TreeRenderer(tree)
+    index.load(make_tasks())
+    renderer.render(index.view(), index.rows)
+    assert tree.children == ["1", "2", "4", "3"]
+    assert tree.items["1"][1] == ("overdue",)
+
+    tree.calls.clear()
+    renderer.render(index.view("report"), index.rows)
+    assert tree.children == ["1", "4"]
+    assert tree.calls == [("set_children", 2)]
+
+    tree.calls.clear()
+    renderer.render(index.view(), index.rows)
+    assert tree.children == ["1", "2", "4", "3"]
+    assert tree.calls == [("set_children", 4)]
+
+    tree.calls.clear()
+    index.upsert({**make_tasks()[0], "completed": True})
+    index.remove(3)
+    renderer.render(index.view(), index.rows)
+    assert tree.calls == [("delete", "3"), ("item", "1"), ("set_children", 3)]
+    assert tree.items["1"] == (("Write report", "work", tree.items["1"][0][2], "✅"), ())
+
+def test_renderer_window():
+    """Test that only `chunk` rows are attached until grow() is called"""
+    index, tree = TaskIndex(), FakeTree()
+    renderer = TreeRenderer(tree, chunk=10)
+    index.load({"id": i, "title": f"Task {i:02}", "tags": "", "completed": False, "due_date": None} for i in range(25))
+    renderer.render(index.view(sort_column="title"), index.rows)
+    assert tree.children == [str(i) for i in range(10)]
+    assert renderer.grow() and renderer.grow()
+    assert tree.children == [str(i) for i in range(25)]
+    assert not renderer.grow()
+
+if __name__ == "__main__":
+    test_index_views()
+    test_renderer_applies_diffs()
+    test_renderer_window()
@@ -0,0 +1,143 @@
+import datetime
+import re
+import pytest
+from sqlalchemy import delete, event, insert, text
+from db import crud, database, schemas, tables
+
+"""
+Query-plan regression suite. Seeds a large multi-tenant dataset, records the SQL each
+crud function issues and asserts with EXPLAIN that no statement scans a whole task
+table. Run against the configured database (Postgres or SQLite).
+"""
+
+USERS = 200
+TASKS_PER_USER = 100
+PREFIX = "planuser"
+OWNER = f"{PREFIX}0"
+TABLES = r"(tasks|task_tags)\b"
+
+
+@pytest.fixture(scope="module")
+def db():
+    database.init_db()
+    session = database.SessionLocal()
+    now = datetime.datetime.now()
+    rows = [
+        {
+            "title": f"Task {u}-{i}", "tags": f"tag{i % 7},shared", "completed": i % 3 == 0,
+            "due_date": now + datetime.timedelta(days=i - 50),
+            "created_at": now, "updated_at": now - datetime.timedelta(minutes=i),
+            "created_by": f"{PREFIX}{u}", "updated_by": f"{PREFIX}{u}",
+        }
+        for u in range(USERS) for i in range(TASKS_PER_USER)
+    ]
+    ids = session.scalars(insert(tables.Task).returning(tables.Task.id), rows).all()
+    session.execute(insert(tables.TaskTag), [
+        {"task_id": task_id, "tag": tag, "created_by": row["created_by"]}
+        for task_id, row in zip(ids, rows) for tag in schemas.parse_tags(row["tags"])
+    ])
+    session.commit()
+    session.execute(text("ANALYZE"))
+    session.commit()
+    yield session
+    session.rollback()
+    # Tags cascade with their tasks; they are listed anyway so no foreign-key setting is assumed.
+    for model in (tables.TaskTag, tables.Task, tables.TaskStats, tables.TaskVersion, tables.TaskChange):
+        session.execute(delete(model).where(model.created_by.like(f"{PREFIX}%")))
+    session.commit()
+    session.close()
+
+
+def capture_statements(func, *args, **kwargs):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and re.search(TABLES, statement) and not statement.lstrip().upper().startswith("INSERT"):
+            statements.append((statement, parameters))
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        result = func(*args, **kwargs)
+        if hasattr(result, "__next__"):
+            list(result)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+    assert statements, "no statements against the task tables were captured"
+    return statements
+
+
+def full_scans(db, statement, parameters):
+    """Returns the plan lines that read every row of a task table."""
+    conn = db.connection()
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN " + statement, parameters).scalars().all()
+        return [line for line in plan if re.search(r"Seq Scan on " + TABLES, line)]
+    plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in plan if re.match(r"SCAN " + TABLES, row[-1])]
+
+
+def assert_index_scans(db, func, *args, **kwargs):
+    for statement, parameters in capture_statements(func, *args, **kwargs):
+        assert full_scans(db, statement, parameters) == [], statement
+
+
+def test_get_task_uses_index(db):
+    task_id = crud.get_tasks(OWNER, db)[0]["id"]
+    assert_index_scans(db, crud.get_task, OWNER, db, task_id)
+
+
+def test_get_tasks_uses_index(db):
+    assert_index_scans(db, crud.get_tasks, OWNER, db)
+    assert_index_scans(db, crud.get_tasks, OWNER, db, completed=False)
+    assert_index_scans(db, crud.get_tasks, OWNER, db, query="Task", mode="substring")
+    assert_index_scans(db, crud.get_tasks, OWNER, db, query="Task", mode="fulltext")
+    assert_index_scans(db, crud.get_tasks, OWNER, db, tags_all=["tag1", "shared"])
+
+
+def test_get_tasks_page_uses_index(db):
+    _, cursor = crud.get_tasks_page(OWNER, db, limit=10)
+    assert_index_scans(db, crud.get_tasks_page, OWNER, db, limit=10, cursor=cursor)
+    assert_index_scans(db, crud.iter_tasks, OWNER, db)
+
+
+def test_due_date_queries_use_index(db):
+    now = datetime.datetime.now()
+    assert_index_scans(db, crud.get_tasks, OWNER, db, overdue=True)
+    assert_index_scans(db, crud.get_tasks, OWNER, db, due_after=now, due_before=now + datetime.timedelta(days=7))
+    _, cursor = crud.get_tasks_page(OWNER, db, limit=10, sort="due_date")
+    assert_index_scans(db, crud.get_tasks_page, OWNER, db, limit=10, cursor=cursor, sort="due_date")
+    assert_index_scans(db, crud.get_upcoming, OWNER, db, datetime.timedelta(days=7))
+
+
+def test_get_tag_counts_uses_index(db):
+    assert_index_scans(db, crud.get_tag_counts, OWNER, db)
+
+
+def test_get_stats_uses_index(db):
+    crud.reconcile_stats(db)
+    assert_index_scans(db, crud.get_stats, OWNER, db)
+
+
+def test_writes_use_index(db):
+    task_id = crud.get_tasks(OWNER, db)[0]["id"]
+    assert_index_scans(db, crud.update_task, OWNER, db, task_id, schemas.TaskUpdate(completed=True))
+    assert_index_scans(db, crud.delete_task, OWNER, db, task_id)
+
+
+def test_batch_uses_index(db):
+    task_ids = [t["id"] for t in crud.get_tasks(OWNER, db)[:3]]
+    operations = schemas.BatchRequest(operations=[
+        {"op": "update", "id": task_ids[0], "task": {"completed": True}},
+        {"op": "delete", "id": task_ids[1]},
+    ]).operations
+    assert_index_scans(db, crud.batch_tasks, OWNER, db, operations)
+
+
+def test_single_statement_writes(db):
+    """update_task/delete_task are one owner-scoped statement each (no SELECT or refresh)."""
+    task_id = crud.get_tasks(OWNER, db)[-1]["id"]
+    db.commit()
+    assert len(capture_statements(crud.update_task, OWNER, db, task_id, schemas.TaskUpdate(title="Renamed"))) == 1
+    assert len(capture_statements(crud.delete_task, OWNER, db, task_id)) == 1
+    assert crud.update_task(OWNER, db, task_id, schemas.TaskUpdate(title="Gone")) is None
+    assert crud.delete_task(OWNER, db, task_id) is False